@@ -7,34 +7,167 @@ Takes namespace and policy-uuid parameters to generate a CSV report of notificat
 import subprocess
 import json
 import csv
+import gzip
 import sys
 import argparse
+import hashlib
+import io
+import itertools
+import operator
 import os
+import time
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from pathlib import Path
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 
+try:
+    import orjson
+    ORJSON_SUPPORT = True
+except ImportError:
+    ORJSON_SUPPORT = False
 
-def run_endorctl_command(command: str, namespace: str) -> Dict[str, Any]:
+# Number of notifications requested per endorctl page
+NOTIFICATION_PAGE_SIZE = 500
+
+# CPUs this process may run on (os.sched_getaffinity is Linux-only)
+AVAILABLE_CPUS = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+
+# Number of project UUIDs per project-name lookup, and how many lookups run at
+# once; lookups are I/O bound, so allow several per CPU
+PROJECT_CHUNK_SIZE = 100
+PROJECT_LOOKUP_WORKERS = min(32, AVAILABLE_CPUS * 4)
+
+# CSV report columns; report rows are tuples in this order
+FIELDNAMES = (
+    "notification_uuid", "notification_link", "state", "branch", "project_name",
+    "project_url", "jira_id", "was_created", "was_updated", "was_resolved", "errors"
+)
+STATE_INDEX = FIELDNAMES.index("state")
+BRANCH_INDEX = FIELDNAMES.index("branch")
+PROJECT_NAME_INDEX = FIELDNAMES.index("project_name")
+
+# Write buffer size for the CSV report
+CSV_BUFFER_SIZE = 1 << 20
+
+# Notification states whose links route to the "open" notifications view
+OPEN_NOTIFICATION_STATES = frozenset({"NOTIFICATION_STATE_OPEN", "NOTIFICATION_STATE_OPEN_NOTIFICATION_PENDING"})
+
+# On-disk cache of endorctl responses; a TTL of None disables the cache
+CACHE_DIR = Path("~/.cache/endorctl-report").expanduser()
+DEFAULT_CACHE_TTL = 600
+MUTATING_SUBCOMMANDS = {"create", "update", "delete"}
+_cache_ttl: Optional[float] = DEFAULT_CACHE_TTL
+
+# Result of the one-time `endorctl --version` probe (None until probed)
+_endorctl_available: Optional[bool] = None
+
+
+def endorctl_available() -> bool:
+    """Return whether endorctl can be executed, probing it only on the first call."""
+    global _endorctl_available
+    if _endorctl_available is None:
+        try:
+            subprocess.run(["endorctl", "--version"], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            _endorctl_available = True
+        except (subprocess.CalledProcessError, FileNotFoundError):
+            _endorctl_available = False
+    return _endorctl_available
+
+
+def configure_cache(ttl: Optional[float]):
+    """Set the cache TTL in seconds, or disable the cache with None."""
+    global _cache_ttl
+    _cache_ttl = ttl
+
+
+def _cache_path(args: List[str], namespace: str) -> Optional[Path]:
+    """Return the cache file for a read-only command, or None if it must not be cached."""
+    if _cache_ttl is None or (args[:1] == ["api"] and args[1:2] and args[1] in MUTATING_SUBCOMMANDS):
+        return None
+    key = hashlib.sha256("\0".join([namespace, *args]).encode("utf-8")).hexdigest()
+    return CACHE_DIR / f"{key}.json"
+
+
+def _read_cache(path: Path) -> Optional[Dict[str, Any]]:
+    """Return a cached response if it exists and is younger than the TTL."""
+    try:
+        if time.time() - path.stat().st_mtime > _cache_ttl:
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _write_cache(path: Path, response: Dict[str, Any]):
+    """Store a response in the cache, ignoring filesystem errors."""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(response, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Warning: could not write cache file {path}: {e}")
+
+
+def loads_json(data: bytes) -> Any:
+    """Parse JSON bytes, using orjson when it is installed."""
+    if ORJSON_SUPPORT:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dig(data: Any, *keys: str, default: Any = "") -> Any:
+    """Return data[key1][key2]... or default if any level is missing."""
+    try:
+        for key in keys:
+            data = data[key]
+    except (KeyError, TypeError):
+        return default
+    return data
+
+
+def run_endorctl_command(args: List[str], namespace: str) -> Dict[str, Any]:
+    """Executes an endorctl command and returns the parsed JSON response.
+
+    Responses to read-only commands are served from the on-disk cache when fresh.
+    """
+    cache_path = _cache_path(args, namespace)
+    if cache_path:
+        cached = _read_cache(cache_path)
+        if cached is not None:
+            return cached
+    
+    response = _run_endorctl_uncached(args, namespace)
+    if cache_path and response:
+        _write_cache(cache_path, response)
+    return response
+
+
+def _run_endorctl_uncached(args: List[str], namespace: str) -> Dict[str, Any]:
     """Executes an endorctl command and returns the parsed JSON response."""
-    full_command = f"endorctl -n {namespace} {command}"
+    full_command = ["endorctl", "-n", namespace, *args]
     try:
         result = subprocess.run(
-            full_command, 
-            shell=True, 
-            check=True, 
-            stdout=subprocess.PIPE, 
-            stderr=subprocess.PIPE,
-            text=True
+            full_command,
+            check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
         )
-        return json.loads(result.stdout)
+        return loads_json(result.stdout)
     except subprocess.CalledProcessError as e:
-        print(f"Error executing command: {full_command}")
-        print(f"Error: {e.stderr}")
+        print(f"Error executing command: {' '.join(full_command)}")
+        print(f"Error: {e.stderr.decode('utf-8', errors='replace')}")
+        return None
+    except FileNotFoundError:
+        print("Error: endorctl is not available. Please ensure it's installed and in your PATH.")
         return None
     except json.JSONDecodeError as e:
         print(f"Error parsing JSON response: {e}")
-        print(f"Raw output: {result.stdout}")
+        print(f"Raw output: {result.stdout.decode('utf-8', errors='replace')}")
         return None
 
 
@@ -42,16 +175,29 @@ def get_policy_details(namespace: str, policy_uuid: str) -> Optional[Dict[str, A
     """Get policy details and validate it's a notification policy."""
     print(f"Retrieving policy details for UUID: {policy_uuid}")
     
-    command = f"api get -r Policy --uuid={policy_uuid} --field-mask='meta.name,spec.policy_type'"
+    # Let the server check the policy type; the policy is only fetched without
+    # the type filter when nothing matches, to tell "not found" from "wrong type"
+    command = [
+        "api", "list", "-r", "Policy",
+        f"--filter=uuid==\"{policy_uuid}\" and spec.policy_type==\"POLICY_TYPE_NOTIFICATION\"",
+        "--field-mask=meta.name,spec.policy_type",
+    ]
     
     response = run_endorctl_command(command, namespace)
+    objects = dig(response, "list", "objects", default=None) or []
+    
+    if objects:
+        response = objects[0]
+    else:
+        command = ["api", "get", "-r", "Policy", f"--uuid={policy_uuid}", "--field-mask=meta.name,spec.policy_type"]
+        response = run_endorctl_command(command, namespace)
     
     if not response:
         print(f"Error: Policy with UUID {policy_uuid} was not found.")
         return None
     
-    policy_name = response.get("meta", {}).get("name", "Unknown")
-    policy_type = response.get("spec", {}).get("policy_type", "")
+    policy_name = dig(response, "meta", "name", default="Unknown")
+    policy_type = dig(response, "spec", "policy_type")
     
     print(f"Found policy: {policy_name}")
     print(f"Policy type: {policy_type}")
@@ -67,34 +213,60 @@ def get_policy_details(namespace: str, policy_uuid: str) -> Optional[Dict[str, A
     }
 
 
-def get_notifications(namespace: str, policy_uuid: str) -> List[Dict[str, Any]]:
-    """Get notifications for a specific policy."""
+def get_notifications(namespace: str, policy_uuid: str, page_size: int = NOTIFICATION_PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+    """Yield notifications for a specific policy one page at a time.
+
+    Page tokens are opaque, so pages cannot be requested out of order; instead
+    the next page is fetched in the background while the current one is consumed.
+    """
     print(f"Retrieving notifications for policy: {policy_uuid}")
     
-    command = f"api list -r Notification --filter='spec.policy_uuid==\"{policy_uuid}\"' --field-mask='uuid,context.id,spec.state,spec.project_uuid,spec.notification_action_data' --list-all"
-    
-    response = run_endorctl_command(command, namespace)
-    
-    if not response:
-        print("Error: Failed to retrieve notifications.")
-        return []
-    
-    objects = response.get("list", {}).get("objects", [])
-    print(f"Retrieved {len(objects)} notifications")
+    def fetch_page(page_token: Optional[str]) -> Dict[str, Any]:
+        command = [
+            "api", "list", "-r", "Notification",
+            f"--filter=spec.policy_uuid==\"{policy_uuid}\"",
+            "--field-mask=uuid,context.id,spec.state,spec.project_uuid,spec.notification_action_data",
+            f"--page-size={page_size}",
+        ]
+        if page_token:
+            command.append(f"--page-token={page_token}")
+        return run_endorctl_command(command, namespace)
+    
+    total = 0
+    pages = 0
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(fetch_page, None)
+        while future:
+            response = future.result()
+            
+            if not response:
+                print("Error: Failed to retrieve notifications.")
+                if pages:
+                    # Earlier pages were already yielded; stop rather than report a partial result
+                    sys.exit(1)
+                return
+            pages += 1
+            
+            list_payload = response.get("list", {})
+            page_token = list_payload.get("response", {}).get("next_page_token")
+            future = executor.submit(fetch_page, page_token) if page_token else None
+            
+            objects = list_payload.get("objects", [])
+            total += len(objects)
+            yield from objects
     
-    return objects
+    print(f"Retrieved {total} notifications")
 
 
-def get_project_names(namespace: str, project_uuids: List[str]) -> Dict[str, str]:
-    """Get project names for a list of project UUIDs."""
-    if not project_uuids:
-        return {}
-    
-    print(f"Retrieving project names for {len(project_uuids)} projects")
-    
+def get_project_names_chunk(namespace: str, project_uuids: List[str]) -> Dict[str, str]:
+    """Get project names for a single chunk of project UUIDs."""
     # Create filter string for multiple UUIDs
     uuid_list = "', '".join(project_uuids)
-    command = f"api list --resource Project --namespace {namespace} --filter \"uuid in ['{uuid_list}']\" --traverse --field-mask=\"uuid,spec.git.full_name\""
+    command = [
+        "api", "list", "--resource", "Project", "--namespace", namespace,
+        "--filter", f"uuid in ['{uuid_list}']",
+        "--traverse", "--field-mask=uuid,spec.git.full_name",
+    ]
     
     response = run_endorctl_command(command, namespace)
     
@@ -107,142 +279,155 @@ def get_project_names(namespace: str, project_uuids: List[str]) -> Dict[str, str
     
     for project in objects:
         uuid = project.get("uuid", "")
-        full_name = project.get("spec", {}).get("git", {}).get("full_name", "Unknown")
+        full_name = dig(project, "spec", "git", "full_name", default="Unknown")
         projects[uuid] = full_name
     
     return projects
 
 
-def extract_jira_data(notification_action_data: Dict[str, Any]) -> Dict[str, Any]:
-    """Extract JIRA-related data from notification_action_data."""
+def get_project_names(namespace: str, project_uuids: List[str], max_workers: int = PROJECT_LOOKUP_WORKERS) -> Dict[str, str]:
+    """Get project names for a list of project UUIDs.
+
+    UUIDs are looked up in chunks of PROJECT_CHUNK_SIZE so the filter stays
+    small, with the chunks fetched concurrently.
+    """
+    if not project_uuids:
+        return {}
+    
+    print(f"Retrieving project names for {len(project_uuids)} projects")
+    
+    uuid_iter = iter(project_uuids)
+    chunks = list(iter(lambda: list(itertools.islice(uuid_iter, PROJECT_CHUNK_SIZE)), []))
+    
+    projects = {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+        for chunk_projects in executor.map(lambda chunk: get_project_names_chunk(namespace, chunk), chunks):
+            projects.update(chunk_projects)
+    
+    return projects
+
+
+def extract_action_summary(notification_action_data: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+    """Extract JIRA-related data and aggregated errors from notification_action_data in one pass."""
     jira_data = {
         "jira_id": "",
         "was_created": False,
         "was_updated": False,
         "was_resolved": False
     }
+    errors = []
+    jira_found = False
     
-    if not notification_action_data:
-        return jira_data
-    
-    # Find JIRA action
-    for action_id, action_data in notification_action_data.items():
-        if action_data.get("notification_target_type") == "ACTION_TYPE_JIRA":
+    for action_data in (notification_action_data or {}).values():
+        notification_target_type = action_data.get("notification_target_type", "")
+        
+        # Use the first JIRA action
+        if not jira_found and notification_target_type == "ACTION_TYPE_JIRA":
+            jira_found = True
             jira_data["was_created"] = action_data.get("open_action_complete", False)
             jira_data["was_updated"] = action_data.get("update_action_complete", False)
             jira_data["was_resolved"] = action_data.get("resolve_action_complete", False)
             
             # Get JIRA issue key if available
-            metadata = action_data.get("metadata", {})
-            data = metadata.get("data", {})
-            jira_data["jira_id"] = data.get("issue_key", "")
-            break
-    
-    return jira_data
-
-
-def extract_errors(notification_action_data: Dict[str, Any]) -> str:
-    """Extract and aggregate errors from notification_action_data."""
-    errors = []
-    
-    if not notification_action_data:
-        return ""
-    
-    for action_id, action_data in notification_action_data.items():
-        error_status = action_data.get("error_status", "")
-        notification_target_type = action_data.get("notification_target_type", "")
+            jira_data["jira_id"] = dig(action_data, "metadata", "data", "issue_key")
         
+        error_status = action_data.get("error_status", "")
         if error_status:
-            errors.append(f"{notification_target_type}_{error_status}")
+            errors.append((notification_target_type, error_status))
     
-    return "|".join(errors)
+    if not errors:
+        return jira_data, ""
+    return jira_data, "|".join(["_".join(error) for error in errors])
 
 
-def process_notifications(notifications: List[Dict[str, Any]], namespace: str, policy_name: str, policy_uuid: str, policy_name_for_filter: str):
-    """Process notifications and generate CSV report."""
-    if not notifications:
-        print("No notifications found to process.")
-        return
-    
-    # Extract unique project UUIDs
-    project_uuids = list(set([
-        notification.get("spec", {}).get("project_uuid", "")
-        for notification in notifications
-        if notification.get("spec", {}).get("project_uuid")
-    ]))
-    
-    # Get project names
-    project_names = get_project_names(namespace, project_uuids)
-    
-    # Create generated_reports directory if it doesn't exist
-    os.makedirs("generated_reports", exist_ok=True)
-    
-    # Generate output filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    safe_policy_name = policy_name.replace(" ", "_").replace("/", "_").replace("\\", "_")
-    output_filename = f"generated_reports/policy_{policy_uuid}_{safe_policy_name}_{timestamp}.csv"
-    
-    # Process notifications and collect data for sorting
+def process_notifications(notifications: Iterable[Dict[str, Any]], namespace: str, policy_name: str, policy_uuid: str, policy_name_for_filter: str, compress: bool = False):
+    """Process notifications and generate CSV report, gzip-compressed if compress is set."""
+    # Reduce each notification to a FIELDNAMES-ordered row tuple as pages arrive
+    # so the raw action data is not kept around. The project_name slot holds the
+    # project UUID until names have been looked up.
     notification_data = []
     
+    # URL pieces that are the same for every notification
+    encoded_policy_name = urllib.parse.quote(policy_name_for_filter)
+    # The resourceDetail JSON is part of the prefix/suffix, so only the UUID is inserted per row
+    open_link_prefix = f'https://app.endorlabs.com/t/{namespace}/notifications/open?resourceDetail={{"notificationUuid":"'
+    resolved_link_prefix = f'https://app.endorlabs.com/t/{namespace}/notifications/resolved?resourceDetail={{"notificationUuid":"'
+    link_suffix = f'"}}&filter.search={encoded_policy_name}'
+    project_url_prefix = f"https://app.endorlabs.com/t/{namespace}/projects/"
+    
     for notification in notifications:
             uuid = notification.get("uuid", "")
-            context = notification.get("context", {})
-            spec = notification.get("spec", {})
+            spec = notification.get("spec") or {}
             notification_action_data = spec.get("notification_action_data", {})
             
             project_uuid = spec.get("project_uuid", "")
-            project_name = project_names.get(project_uuid, "Unknown")
-            branch = context.get("id", "")
+            branch = dig(notification, "context", "id")
             state = spec.get("state", "")
             
-            # Extract JIRA data
-            jira_data = extract_jira_data(notification_action_data)
-            
-            # Extract errors
-            errors = extract_errors(notification_action_data)
+            # Extract JIRA data and errors
+            jira_data, errors = extract_action_summary(notification_action_data)
             
             # Create notification link based on state
-            encoded_policy_name = urllib.parse.quote(policy_name_for_filter)
-            if state in ["NOTIFICATION_STATE_OPEN", "NOTIFICATION_STATE_OPEN_NOTIFICATION_PENDING"]:
-                notification_link = f"https://app.endorlabs.com/t/{namespace}/notifications/open?resourceDetail={{\"notificationUuid\":\"{uuid}\"}}&filter.search={encoded_policy_name}"
-            else:
-                notification_link = f"https://app.endorlabs.com/t/{namespace}/notifications/resolved?resourceDetail={{\"notificationUuid\":\"{uuid}\"}}&filter.search={encoded_policy_name}"
+            link_prefix = open_link_prefix if state in OPEN_NOTIFICATION_STATES else resolved_link_prefix
+            notification_link = link_prefix + uuid + link_suffix
             
             # Create project URL
-            project_url = f"https://app.endorlabs.com/t/{namespace}/projects/{project_uuid}"
+            project_url = project_url_prefix + project_uuid
             
-            notification_data.append({
-                "notification_uuid": uuid,
-                "notification_link": notification_link,
-                "state": state,
-                "branch": branch,
-                "project_name": project_name,
-                "project_url": project_url,
-                "jira_id": jira_data["jira_id"],
-                "was_created": jira_data["was_created"],
-                "was_updated": jira_data["was_updated"],
-                "was_resolved": jira_data["was_resolved"],
-                "errors": errors
-            })
+            notification_data.append((
+                uuid,
+                notification_link,
+                state,
+                branch,
+                project_uuid,
+                project_url,
+                jira_data["jira_id"],
+                jira_data["was_created"],
+                jira_data["was_updated"],
+                jira_data["was_resolved"],
+                errors
+            ))
+    
+    if not notification_data:
+        print("No notifications found to process.")
+        return
+    
+    # Extract unique project UUIDs, keeping first-seen order so lookups (and cache keys) are stable
+    project_uuids = list(dict.fromkeys(row[PROJECT_NAME_INDEX] for row in notification_data if row[PROJECT_NAME_INDEX]))
+    
+    # Get project names
+    project_names = get_project_names(namespace, project_uuids)
+    notification_data = [
+        row[:PROJECT_NAME_INDEX] + (project_names.get(row[PROJECT_NAME_INDEX], "Unknown"),) + row[PROJECT_NAME_INDEX + 1:]
+        for row in notification_data
+    ]
+    
+    # Create generated_reports directory if it doesn't exist
+    os.makedirs("generated_reports", exist_ok=True)
+    
+    # Generate output filename
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    safe_policy_name = policy_name.replace(" ", "_").replace("/", "_").replace("\\", "_")
+    output_filename = f"generated_reports/policy_{policy_uuid}_{safe_policy_name}_{timestamp}.csv"
+    if compress:
+        output_filename += ".gz"
     
     # Sort the data by project_name, state, and branch
-    notification_data.sort(key=lambda x: (x["project_name"], x["state"], x["branch"]))
+    notification_data.sort(key=operator.itemgetter(PROJECT_NAME_INDEX, STATE_INDEX, BRANCH_INDEX))
     
     # Write sorted data to CSV
-    with open(output_filename, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = [
-            "notification_uuid", "notification_link", "state", "branch", "project_name", 
-            "project_url", "jira_id", "was_created", "was_updated", "was_resolved", "errors"
-        ]
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        
-        for row in notification_data:
-            writer.writerow(row)
+    # Encode into a large binary buffer so big reports are written in few syscalls
+    with open(output_filename, 'wb', buffering=CSV_BUFFER_SIZE) as rawfile:
+        # Level 1 gzip: the URL columns are highly repetitive, so even the
+        # fastest level shrinks the report considerably for little CPU
+        binfile = gzip.GzipFile(fileobj=rawfile, mode='wb', compresslevel=1) if compress else rawfile
+        with io.TextIOWrapper(binfile, encoding='utf-8', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(FIELDNAMES)
+            writer.writerows(notification_data)
     
     print(f"\nReport generated successfully: {output_filename}")
-    print(f"Total notifications processed: {len(notifications)}")
+    print(f"Total notifications processed: {len(notification_data)}")
 
 
 def main():
@@ -250,8 +435,13 @@ def main():
     parser = argparse.ArgumentParser(description="Generate action policy notifications report")
     parser.add_argument("-n", "--namespace", required=True, help="Namespace to process")
     parser.add_argument("--policy-uuid", required=True, help="Policy UUID to generate report for")
+    parser.add_argument("--gzip", action="store_true", help="Write the report as a gzip-compressed .csv.gz file")
+    parser.add_argument("--no-cache", action="store_true", help="Always query endorctl instead of reusing cached responses")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_CACHE_TTL,
+                        help=f"Seconds a cached endorctl response stays valid (default: {DEFAULT_CACHE_TTL})")
     
     args = parser.parse_args()
+    configure_cache(None if args.no_cache else args.cache_ttl)
     
     namespace = args.namespace
     policy_uuid = args.policy_uuid
@@ -262,22 +452,26 @@ def main():
     print("-" * 50)
     
     # Check if endorctl is available
-    try:
-        subprocess.run(["endorctl", "--version"], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    except (subprocess.CalledProcessError, FileNotFoundError):
+    if not endorctl_available():
         print("Error: endorctl is not available. Please ensure it's installed and in your PATH.")
         sys.exit(1)
     
-    # Get and validate policy details
-    policy_details = get_policy_details(namespace, policy_uuid)
+    # Get notifications for the policy, fetching the policy details in the
+    # background while the first page of notifications is retrieved
+    notifications = get_notifications(namespace, policy_uuid)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        policy_future = executor.submit(get_policy_details, namespace, policy_uuid)
+        first_notification = next(notifications, None)
+        policy_details = policy_future.result()
+    
+    # Validate policy details before processing anything
     if not policy_details:
         sys.exit(1)
-    
-    # Get notifications for the policy
-    notifications = get_notifications(namespace, policy_uuid)
+    if first_notification is not None:
+        notifications = itertools.chain([first_notification], notifications)
     
     # Process notifications and generate report
-    process_notifications(notifications, namespace, policy_details["name"], policy_uuid, policy_details["name"])
+    process_notifications(notifications, namespace, policy_details["name"], policy_uuid, policy_details["name"], compress=args.gzip)
     
     print("\nNotification report generation completed successfully!")
 
@@ -1,4 +1,8 @@
+import argparse
+import json
+import os
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 # List of project UUIDs to update
 project_uuids = [
@@ -9,24 +13,55 @@ project_uuids = [
 # Scan profile UUID to be used in the update command
 scan_profile_uuid = "your_scan_profile_uuid"
 
+def available_cpus():
+    """Number of CPUs this process may run on (falls back to os.cpu_count() off Linux)."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
 def update_project(uuid, scan_uuid):
-    """Executes the endorctl command for a given project UUID and scan profile UUID."""
-    command = (
-        f"endorctl api update -r Project --uuid={uuid} -d '{{\"spec\":{{\"scan_profile_uuid\": \"{scan_uuid}\"}}}}' "
-        "--field-mask 'spec.scan_profile_uuid'"
-    )
+    """Executes the endorctl command for a given project UUID and scan profile UUID.
+
+    Returns a (uuid, ok, message) tuple so results can be reported once all updates finish.
+    """
+    command = [
+        "endorctl", "api", "update", "-r", "Project", f"--uuid={uuid}",
+        "-d", json.dumps({"spec": {"scan_profile_uuid": scan_uuid}}),
+        "--field-mask", "spec.scan_profile_uuid",
+    ]
     try:
-        result = subprocess.run(command, shell=True, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        print(f"Successfully updated project {uuid}:")
-        print(result.stdout.decode())
+        result = subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        return uuid, True, result.stdout
     except subprocess.CalledProcessError as e:
-        print(f"Error updating project {uuid}: {e.stderr.decode()}")
+        return uuid, False, e.stderr
+    except OSError as e:
+        # e.g. endorctl is not installed or not on PATH
+        return uuid, False, str(e)
 
 def main():
     """Main function to update all project UUIDs."""
-    for uuid in project_uuids:
-        print(f"Updating project {uuid} with scan profile {scan_profile_uuid}...")
-        update_project(uuid, scan_profile_uuid)
+    parser = argparse.ArgumentParser(description="Assign a scan profile to many projects")
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=max(1, min(32, available_cpus() * 4, len(project_uuids))),
+        help="Number of concurrent project updates (default: min(32, 4 x available CPUs, number of projects))",
+    )
+    args = parser.parse_args()
+
+    print(f"Updating {len(project_uuids)} projects with scan profile {scan_profile_uuid}...")
+    with ThreadPoolExecutor(max_workers=args.max_workers) as executor:
+        results = list(executor.map(lambda u: update_project(u, scan_profile_uuid), project_uuids))
+
+    for uuid, ok, message in results:
+        if ok:
+            print(f"Successfully updated project {uuid}:")
+            print(message)
+        else:
+            print(f"Error updating project {uuid}: {message}")
+
+    succeeded = sum(1 for _, ok, _ in results if ok)
+    print(f"Done: {succeeded} succeeded, {len(results) - succeeded} failed")
 
 if __name__ == "__main__":
     main()
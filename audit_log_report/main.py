@@ -7,21 +7,99 @@ for user navigation and user actions using Streamlit for interactive visualizati
 """
 
 import argparse
+import functools
+import hashlib
 import json
+import logging
 import os
 import subprocess
 import sys
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterable, List, Any, Optional, Tuple
 import re
 
+import ijson
+import orjson
 import streamlit as st
 import pandas as pd
 
+# Pipe and parser read size used when reading endorctl output (bytes, never decoded to str)
+STREAM_BUFFER_SIZE = 1024 * 1024
 
-def get_audit_logs(namespace: str, date_range: str, report_type: str, email_filter: Optional[str] = None) -> List[Dict[str, Any]]:
-    """Get audit logs for the specified namespace, date range, and report type."""
-    st.info(f"Getting {report_type} audit logs for date range: {date_range}")
+# Maximum number of endorctl processes fetching date-range slices at once
+MAX_FETCH_WORKERS = 8
+
+# Seconds that fetched and processed audit logs stay cached between reruns
+AUDIT_LOG_CACHE_TTL = 600
+
+# Joins the columns of a row for the all-columns search
+SEARCH_SEPARATOR = "\x1f"
+
+# Rows sent to the browser per page of the results table
+DISPLAY_PAGE_SIZE = 500
+
+# Maximum number of distinct claims lists kept parsed in memory
+CLAIMS_CACHE_SIZE = 10000
+
+# Output columns for each report type
+UI_TELEMETRY_COLUMNS = ["namespace", "date", "email", "claims", "event", "value", "domain", "browser", "os"]
+USER_TELEMETRY_COLUMNS = ["namespace", "date", "email", "claims", "event", "value", "timestamp", "domain", "properties"]
+
+# Low-cardinality columns stored as categoricals; their categories double as filter options
+CATEGORICAL_COLUMNS = ["email", "namespace", "event", "domain", "browser", "os"]
+
+# Columns holding dicts that are only JSON-encoded when displayed or exported
+JSON_COLUMNS = ["properties"]
+
+# Where UI telemetry events live in an audit log entry, and the per-log fields copied onto each event
+UI_EVENTS_PATH = ["spec", "payload", "spec", "events"]
+UI_LOG_FIELDS = [
+    "spec.claims",
+    "spec.payload.tenant_meta.namespace",
+    "spec.payload.spec.device_user_agent.browser_name",
+    "spec.payload.spec.device_user_agent.os_name",
+]
+
+# File name slug for each report type
+REPORT_SLUG = {"User Navigation": "user_navigation", "User Actions": "user_actions"}
+
+# File name of the filtered-data download
+DOWNLOAD_FILENAME_TEMPLATE = "audit_logs_{slug}_{namespace}_{timestamp}.csv"
+
+# Fields requested from endorctl for each report type. Only what the processors read is
+# fetched, so adding a processed column requires extending the matching mask here.
+FIELD_MASK_MAP = {
+    "User Navigation": ",".join(["spec.message_kind", *UI_LOG_FIELDS, ".".join(UI_EVENTS_PATH)]),
+    "User Actions": ",".join([
+        "spec.message_kind",
+        "spec.claims",
+        "spec.payload.spec.event_store",
+        "spec.payload.tenant_meta.namespace",
+        "spec.payload.meta.create_time",
+    ]),
+}
+
+
+logger = logging.getLogger("audit_log_report")
+
+
+class AuditLogFetchError(Exception):
+    """Raised after an endorctl failure has been reported, so the failure is not cached."""
+
+
+@st.cache_data(ttl=AUDIT_LOG_CACHE_TTL, show_spinner=False)
+def get_audit_logs(namespace: str, date_range: str, report_type: str, email_filter: Optional[str] = None,
+                   debug: bool = False) -> List[Dict[str, Any]]:
+    """Get audit logs for the specified namespace, date range, and report type.
+
+    Results are cached for AUDIT_LOG_CACHE_TTL seconds per set of inputs. Diagnostic
+    messages are only shown in the app when debug is set.
+    """
+    if debug:
+        st.info(f"Getting {report_type} audit logs for date range: {date_range}")
     
     # Calculate the cutoff time based on date_range (support both days and hours)
     time_map = {
@@ -43,181 +121,356 @@ def get_audit_logs(namespace: str, date_range: str, report_type: str, email_filt
     # Get the time value and determine if it's hours or days
     if date_range.endswith('H'):
         # Hours - use timestamp comparison for precision
-        hours = time_map.get(date_range, 1)
+        slice_count = time_map.get(date_range, 1)
+        slice_step = timedelta(hours=1)
+        boundary_format = "%Y-%m-%dT%H:%M:%SZ"
         # Use UTC time to avoid timezone issues
-        cutoff_time = datetime.utcnow() - timedelta(hours=hours)
-        timestamp_rfc = cutoff_time.strftime("%Y-%m-%dT%H:%M:%SZ")
-        st.info(f"Cutoff time (hours) UTC: {timestamp_rfc}")
+        cutoff_time = datetime.utcnow() - timedelta(hours=slice_count)
+        logger.debug("Cutoff time (hours) UTC: %s", cutoff_time.strftime(boundary_format))
     else:
         # Days - use date comparison
-        days = time_map.get(date_range, 1)
-        cutoff_date = (datetime.utcnow() - timedelta(days=days)).strftime("%Y-%m-%d")
-        timestamp_rfc = cutoff_date
-        st.info(f"Cutoff date (days) UTC: {cutoff_date}")
+        slice_count = time_map.get(date_range, 1)
+        slice_step = timedelta(days=1)
+        boundary_format = "%Y-%m-%d"
+        cutoff_time = datetime.utcnow() - timedelta(days=slice_count)
+        logger.debug("Cutoff date (days) UTC: %s", cutoff_time.strftime(boundary_format))
+    
+    # Split the range into one slice per hour/day; the last slice is open-ended
+    boundaries = [(cutoff_time + i * slice_step).strftime(boundary_format) for i in range(slice_count)]
+    slices = list(zip(boundaries, boundaries[1:] + [None]))
     
     # Build filter expression
     if email_filter and email_filter.strip():
-        filter_expr = f'spec.claims matches ".*{email_filter.strip()}.*" and spec.message_kind=="{message_kind}" and meta.create_time > date("{timestamp_rfc}")'
+        base_filter = f'spec.claims matches ".*{email_filter.strip()}.*" and spec.message_kind=="{message_kind}"'
     else:
-        filter_expr = f'spec.message_kind=="{message_kind}" and meta.create_time > date("{timestamp_rfc}")'
+        base_filter = f'spec.message_kind=="{message_kind}"'
     
-    cmd = [
-        "endorctl", "api", "list", "-r", "AuditLog", "-n", namespace,
-        "--filter", filter_expr,
-        "--field-mask", "spec.message_kind,spec.claims,spec.payload",
-        "--list-all", "-t", "300s", "--traverse"
-    ]
+    commands = []
+    for start, end in slices:
+        filter_expr = f'{base_filter} and meta.create_time > date("{start}")'
+        if end:
+            filter_expr += f' and meta.create_time <= date("{end}")'
+        commands.append([
+            "endorctl", "api", "list", "-r", "AuditLog", "-n", namespace,
+            "--filter", filter_expr,
+            "--field-mask", FIELD_MASK_MAP[report_type],
+            "--list-all", "-t", "300s", "--traverse"
+        ])
     
-    # Debug: Show the exact command being run
-    st.info(f"Running command: {' '.join(cmd)}")
-    print(f"[AUDIT LOG] Running endorctl command: {' '.join(cmd)}")
+    # Debug: Show the exact commands being run
+    for cmd in commands:
+        if debug:
+            st.info(f"Running command: {' '.join(cmd)}")
+        logger.debug("Running endorctl command: %s", ' '.join(cmd))
     
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        print(f"[AUDIT LOG] Command completed successfully. Response length: {len(result.stdout)} chars")
-        st.info(f"Command stdout length: {len(result.stdout)}")
-        st.info(f"Command stderr length: {len(result.stderr)}")
+        # Slices are disjoint, so their results are concatenated in time order without deduplication
+        with ThreadPoolExecutor(max_workers=min(MAX_FETCH_WORKERS, len(commands))) as executor:
+            slice_results = list(executor.map(_stream_audit_logs, commands))
         
-        if result.stdout.strip():
-            data = json.loads(result.stdout)
-            audit_logs = data.get("list", {}).get("objects", [])
-            st.success(f"Found {len(audit_logs)} audit log entries")
+        if any(result is not None for result in slice_results):
+            audit_logs = [log_entry for result in slice_results if result for log_entry in result]
+            logger.debug("Command completed successfully. Parsed %d entries", len(audit_logs))
             
-            # Debug: Show first few entries to see the structure
-            if audit_logs:
-                first_entry = audit_logs[0]
-                st.info(f"Sample entry structure: {list(first_entry.keys())}")
+            # Debug: Show the count and the structure of the first entry
+            if debug:
+                st.success(f"Found {len(audit_logs)} audit log entries")
+                if audit_logs:
+                    st.info(f"Sample entry structure: {list(audit_logs[0].keys())}")
             
             return audit_logs
         else:
             st.warning("No stdout from command - this might indicate an issue")
             return []
     except subprocess.CalledProcessError as e:
-        print(f"[AUDIT LOG] Command failed with error: {e}")
-        print(f"[AUDIT LOG] stderr: {e.stderr}")
+        logger.error("Command failed with error: %s", e)
+        logger.error("stderr: %s", e.stderr)
         st.error(f"Error getting audit logs: {e}")
         st.error(f"stderr: {e.stderr}")
-        return []
-    except json.JSONDecodeError as e:
-        print(f"[AUDIT LOG] JSON parsing error: {e}")
+        raise AuditLogFetchError(str(e)) from e
+    except ijson.JSONError as e:
+        logger.error("JSON parsing error: %s", e)
         st.error(f"Error parsing audit logs response: {e}")
-        return []
+        raise AuditLogFetchError(str(e)) from e
 
 
-def extract_claims_info(claims: List[str]) -> Dict[str, str]:
-    """Extract structured information from claims list."""
+def _stream_audit_logs(cmd: List[str]) -> Optional[List[Dict[str, Any]]]:
+    """Run endorctl and parse audit log objects straight from its stdout pipe.
+
+    Objects are decoded incrementally with ijson, so the raw JSON text is never
+    held in memory alongside the parsed entries. Returns None if the command
+    produced no output.
+    """
+    # stderr goes to a temporary file so a chatty endorctl cannot block on a full pipe
+    with tempfile.TemporaryFile() as stderr_file:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file, bufsize=STREAM_BUFFER_SIZE)
+        audit_logs = None
+        parse_error = None
+        try:
+            if proc.stdout.peek(1).strip():
+                audit_logs = list(ijson.items(
+                    proc.stdout, "list.objects.item", use_float=True, buf_size=STREAM_BUFFER_SIZE
+                ))
+        except ijson.JSONError as e:
+            parse_error = e
+        finally:
+            proc.stdout.close()
+            returncode = proc.wait()
+        
+        if returncode != 0:
+            stderr_file.seek(0)
+            raise subprocess.CalledProcessError(returncode, cmd, stderr=stderr_file.read().decode("utf-8", errors="replace"))
+    
+    if parse_error:
+        raise parse_error
+    return audit_logs
+
+
+@functools.lru_cache(maxsize=CLAIMS_CACHE_SIZE)
+def _parse_claims(claims: Tuple[str, ...]) -> Tuple[Dict[str, str], str]:
+    """Parse a claims tuple into its claims info dict and that dict's JSON encoding.
+
+    The same users appear in many log entries, so results are cached per unique
+    claims tuple. The returned dict is shared between callers and must not be mutated.
+    """
     claims_info = {}
     for claim in claims:
-        if '=' in claim:
-            key, value = claim.split('=', 1)
-            claims_info[key] = value
-        else:
-            claims_info[claim] = claim
-    return claims_info
+        key, sep, value = claim.partition('=')
+        claims_info[key] = value if sep else claim
+    return claims_info, json.dumps(claims_info)
+
+
+def extract_claims_info(claims: List[str]) -> Dict[str, str]:
+    """Extract structured information from claims list."""
+    return dict(_parse_claims(tuple(claims))[0])
+
 
+def _get_path(data: Any, path: List[str]) -> Any:
+    """Return the value at a nested key path, or None if any level is missing."""
+    for key in path:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
 
-def process_ui_telemetry_data(audit_logs: List[Dict[str, Any]]) -> pd.DataFrame:
+
+def _parse_claims_cell(claims: Any) -> Tuple[Dict[str, str], str]:
+    """_parse_claims for a normalized claims cell, which is empty when claims were absent."""
+    return _parse_claims(tuple(claims) if isinstance(claims, list) else ())
+
+
+def _set_column_types(df: pd.DataFrame) -> pd.DataFrame:
+    """Store the low-cardinality string columns of a report as categoricals and parse its dates.
+
+    Done once at processing time so the cached report is ready to display and filter as-is.
+    """
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'], errors='coerce')
+    return df
+
+
+def process_ui_telemetry_data(audit_logs: Iterable[Dict[str, Any]]) -> pd.DataFrame:
     """Process UI Telemetry data into a DataFrame."""
-    processed_data = []
+    # json_normalize requires the record path on every entry, so skip entries without events
+    logs = [log_entry for log_entry in audit_logs if _get_path(log_entry, UI_EVENTS_PATH)]
+    if not logs:
+        return pd.DataFrame(columns=UI_TELEMETRY_COLUMNS)
     
-    for log_entry in audit_logs:
-        spec = log_entry.get("spec", {})
-        payload = spec.get("payload", {})
-        payload_spec = payload.get("spec", {})
-        events = payload_spec.get("events", [])
-        tenant_meta = payload.get("tenant_meta", {})
-        claims = spec.get("claims", [])
-        
-        # Extract claims information
-        claims_info = extract_claims_info(claims)
-        
-        # Process each event
-        for event in events:
-            processed_data.append({
-                "namespace": tenant_meta.get("namespace", ""),
-                "date": event.get("timestamp", ""),
-                "email": claims_info.get("email", ""),
-                "claims": json.dumps(claims_info),
-                "event": event.get("key", ""),
-                "value": event.get("value", ""),
-                "domain": claims_info.get("domain", ""),
-                "browser": payload_spec.get("device_user_agent", {}).get("browser_name", ""),
-                "os": payload_spec.get("device_user_agent", {}).get("os_name", "")
-            })
+    # Flatten the per-log fields, then explode to one row per event with those fields repeated
+    events_column = ".".join(UI_EVENTS_PATH)
+    log_fields = pd.json_normalize(logs).reindex(columns=UI_LOG_FIELDS + [events_column])
     
-    return pd.DataFrame(processed_data)
+    # Claims are parsed once per log, before the explode repeats the results for each event
+    parsed_claims = [_parse_claims_cell(claims) for claims in log_fields["spec.claims"]]
+    log_fields = log_fields.assign(
+        email=[claims_info.get("email", "") for claims_info, _ in parsed_claims],
+        domain=[claims_info.get("domain", "") for claims_info, _ in parsed_claims],
+        claims=[claims_json for _, claims_json in parsed_claims],
+    )
+    
+    log_fields = log_fields.explode(events_column, ignore_index=True)
+    # Events are read as-is rather than normalized, which would split dict values into value.* columns
+    events = pd.DataFrame(
+        [(event.get("timestamp", ""), event.get("key", ""), event.get("value", "")) for event in log_fields[events_column]],
+        columns=["timestamp", "key", "value"],
+    )
+    log_fields = log_fields.fillna("")
+    
+    return _set_column_types(pd.DataFrame({
+        "namespace": log_fields["spec.payload.tenant_meta.namespace"],
+        "date": events["timestamp"],
+        "email": log_fields["email"],
+        "claims": log_fields["claims"],
+        "event": events["key"],
+        "value": events["value"],
+        "domain": log_fields["domain"],
+        "browser": log_fields["spec.payload.spec.device_user_agent.browser_name"],
+        "os": log_fields["spec.payload.spec.device_user_agent.os_name"]
+    }, columns=UI_TELEMETRY_COLUMNS))
 
 
-def process_user_telemetry_data(audit_logs: List[Dict[str, Any]]) -> pd.DataFrame:
-    """Process User Telemetry data into a DataFrame."""
-    processed_data = []
+def _user_telemetry_columns(audit_logs: Iterable[Dict[str, Any]]) -> Dict[str, list]:
+    """Collect USER_TELEMETRY_COLUMNS as one list per column, one entry per event in each log's event store."""
+    columns = {col: [] for col in USER_TELEMETRY_COLUMNS}
+    (add_namespace, add_date, add_email, add_claims, add_event,
+     add_value, add_timestamp, add_domain, add_properties) = (columns[col].append for col in USER_TELEMETRY_COLUMNS)
     
     for log_entry in audit_logs:
         spec = log_entry.get("spec", {})
         payload = spec.get("payload", {})
-        payload_spec = payload.get("spec", {})
-        event_store = payload_spec.get("event_store", {})
-        tenant_meta = payload.get("tenant_meta", {})
-        claims = spec.get("claims", [])
-        meta = payload.get("meta", {})
+        event_store = payload.get("spec", {}).get("event_store", {})
         
-        # Extract claims information
-        claims_info = extract_claims_info(claims)
+        # Per-log values are looked up once and repeated for each of its events
+        namespace = payload.get("tenant_meta", {}).get("namespace", "")
+        create_time = payload.get("meta", {}).get("create_time", "")
+        claims_info, claims_json = _parse_claims(tuple(spec.get("claims", [])))
+        email = claims_info.get("email", "")
+        domain = claims_info.get("domain", "")
         
         # Process each event in the event store
         for event_key, event_data in event_store.items():
             if isinstance(event_data, dict):
-                processed_data.append({
-                    "namespace": tenant_meta.get("namespace", ""),
-                    "date": meta.get("create_time", ""),
-                    "email": claims_info.get("email", ""),
-                    "claims": json.dumps(claims_info),
-                    "event": event_key,
-                    "value": event_data.get("value", ""),
-                    "timestamp": event_data.get("timestamp", ""),
-                    "domain": claims_info.get("domain", ""),
-                    "properties": json.dumps(event_data.get("properties", {}))
-                })
+                add_namespace(namespace)
+                add_date(create_time)
+                add_email(email)
+                add_claims(claims_json)
+                add_event(event_key)
+                add_value(event_data.get("value", ""))
+                add_timestamp(event_data.get("timestamp", ""))
+                add_domain(domain)
+                add_properties(event_data.get("properties", {}))
     
-    return pd.DataFrame(processed_data)
+    return columns
+
+
+def process_user_telemetry_data(audit_logs: Iterable[Dict[str, Any]]) -> pd.DataFrame:
+    """Process User Telemetry data into a DataFrame."""
+    return _set_column_types(pd.DataFrame(_user_telemetry_columns(audit_logs), columns=USER_TELEMETRY_COLUMNS))
+
+
+def audit_logs_digest(audit_logs: List[Dict[str, Any]]) -> str:
+    """Cheap fingerprint of a list of audit logs: entry count plus first and last entry."""
+    digest = hashlib.md5(str(len(audit_logs)).encode())
+    if audit_logs:
+        digest.update(json.dumps([audit_logs[0], audit_logs[-1]], sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
 
+@st.cache_data(ttl=AUDIT_LOG_CACHE_TTL, show_spinner=False)
+def process_audit_logs(_audit_logs: List[Dict[str, Any]], report_type: str, logs_digest: str) -> pd.DataFrame:
+    """Process audit logs for the report type; cached on report_type and logs_digest
+    (the leading underscore keeps Streamlit from hashing the full log list)."""
+    if report_type == "User Navigation":
+        return process_ui_telemetry_data(_audit_logs)
+    return process_user_telemetry_data(_audit_logs)
 
-def save_data(audit_logs: List[Dict[str, Any]], df: pd.DataFrame, output_dir: str, report_type: str) -> None:
+
+def serialize_json_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Return df with JSON_COLUMNS encoded as JSON strings, for display and export.
+
+    These columns hold dicts while processing so that rows which are never
+    shown or exported are never serialized.
+    """
+    json_columns = {col: df[col].map(json.dumps) for col in JSON_COLUMNS if col in df.columns}
+    return df.assign(**json_columns) if json_columns else df
+
+
+def _arrow_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Return df with JSON_COLUMNS encoded and every other object column as strings, for Arrow.
+
+    Object columns such as value can mix dicts, numbers and strings, which Arrow
+    cannot hold in one column. Nulls are kept as nulls.
+    """
+    df = serialize_json_columns(df)
+    object_columns = {col: df[col].astype(str).where(df[col].notna()) for col in df.columns if df[col].dtype == object}
+    return df.assign(**object_columns) if object_columns else df
+
+
+def to_csv_bytes(df: pd.DataFrame) -> bytes:
+    """Return df as CSV bytes, for the download button."""
+    return serialize_json_columns(df).to_csv(index=False).encode()
+
+
+def save_data(audit_logs: List[Dict[str, Any]], df: pd.DataFrame, output_dir: str, report_type: str,
+              debug: bool = False) -> None:
     """Save raw data and processed DataFrame."""
-    st.info("Saving data...")
+    if debug:
+        st.info("Saving data...")
     
     # Create data subdirectory
     data_dir = os.path.join(output_dir, "data")
     os.makedirs(data_dir, exist_ok=True)
     
     # Save raw audit logs
-    with open(os.path.join(data_dir, f"raw_audit_logs_{report_type.lower().replace(' ', '_')}.json"), 'w') as f:
-        json.dump(audit_logs, f, indent=2)
+    with open(os.path.join(data_dir, f"raw_audit_logs_{REPORT_SLUG[report_type]}.json"), 'wb') as f:
+        f.write(orjson.dumps(audit_logs, option=orjson.OPT_INDENT_2))
     
-    # Save processed DataFrame as CSV
-    csv_filename = f"processed_audit_logs_{report_type.lower().replace(' ', '_')}.csv"
-    df.to_csv(os.path.join(data_dir, csv_filename), index=False)
+    # Save processed DataFrame as CSV, plus a Parquet copy that can be reloaded without reprocessing
+    processed_basename = f"processed_audit_logs_{REPORT_SLUG[report_type]}"
+    serialize_json_columns(df).to_csv(os.path.join(data_dir, f"{processed_basename}.csv"), index=False)
+    _arrow_frame(df).to_parquet(
+        os.path.join(data_dir, f"{processed_basename}.parquet"), index=False, compression="zstd"
+    )
     
-    st.success(f"Data saved to {data_dir}")
+    logger.debug("Data saved to %s", data_dir)
+    if debug:
+        st.success(f"Data saved to {data_dir}")
 
 
-def create_filtered_dataframe(df: pd.DataFrame) -> pd.DataFrame:
-    """Create a filtered and sortable DataFrame for display."""
-    if df.empty:
-        return df
-    
-    # Create a copy for filtering
-    filtered_df = df.copy()
-    
-    # Convert date column to datetime for better sorting
-    if 'date' in filtered_df.columns:
-        filtered_df['date'] = pd.to_datetime(filtered_df['date'], errors='coerce')
-    
-    return filtered_df
+def build_search_text(df: pd.DataFrame) -> pd.Series:
+    """Join every string column of each row into a single upper-cased string for searching.
+
+    Case folding is done once here so each search is a plain substring test
+    against search_term.upper() rather than upper-casing every row per search.
+    """
+    df = serialize_json_columns(df)
+    text_columns = [df[col].fillna('').astype(str) for col in df.select_dtypes(include=['object', 'string', 'category']).columns]
+    if not text_columns:
+        return pd.Series('', index=df.index)
+    # Separate columns with a control character so a match cannot span two columns
+    return text_columns[0].str.cat(text_columns[1:], sep=SEARCH_SEPARATOR).str.upper()
+
+
+@st.cache_resource(max_entries=4)
+def _get_analysis(token: str) -> Dict[str, Any]:
+    """Return the results holder for an analysis token.
+
+    Only the token lives in session state; the DataFrame and raw logs are held
+    here by reference so reruns reuse the same objects.
+    """
+    return {}
+
+
+def get_search_text(token: str) -> pd.Series:
+    """Return build_search_text for an analysis token's DataFrame, built on first use and kept with its results."""
+    results = _get_analysis(token)
+    if 'search_text' not in results:
+        results['search_text'] = build_search_text(results['df'])
+    return results['search_text']
+
+
+# Bounded like _get_analysis, whose DataFrames these options are read from
+@st.cache_data(ttl=AUDIT_LOG_CACHE_TTL, max_entries=4, show_spinner=False)
+def _dropdown_options(token: str) -> Dict[str, List[str]]:
+    """Return the filter dropdown options for an analysis token's DataFrame.
+
+    Each list starts with '' for "no filter"; options come from the categorical columns' categories.
+    """
+    df = _get_analysis(token)['df']
+    return {
+        'event': [''] + df['event'].cat.categories.tolist(),
+        'email': [''] + [email for email in df['email'].cat.categories if email],
+        'namespace': [''] + df['namespace'].cat.categories.tolist(),
+    }
 
 
 def main():
     """Main Streamlit app."""
+    logging.basicConfig(format="[AUDIT LOG] %(levelname)s %(message)s")
+    
     st.set_page_config(
         page_title="Audit Log Report",
         page_icon="📋",
@@ -228,8 +481,8 @@ def main():
     # Initialize session state
     if 'show_results' not in st.session_state:
         st.session_state.show_results = False
-    if 'current_results' not in st.session_state:
-        st.session_state.current_results = None
+    if 'analysis_token' not in st.session_state:
+        st.session_state.analysis_token = None
     if 'filter_state' not in st.session_state:
         st.session_state.filter_state = {
             'search_term': '',
@@ -258,7 +511,7 @@ def main():
         
         report_type = st.selectbox(
             "Report Type",
-            options=["User Navigation", "User Actions"],
+            options=list(REPORT_SLUG),
             help="Type of audit log report to generate"
         )
         
@@ -275,6 +528,10 @@ def main():
             help="Filter by specific email or group (optional)"
         )
         
+        # Diagnostic messages in the app, and DEBUG-level log output in the terminal
+        debug = st.toggle("Debug output", key="debug", help="Show endorctl commands and other diagnostics")
+        logger.setLevel(logging.DEBUG if debug else logging.INFO)
+        
         # Generate Report button
         generate_report = st.button("Generate Report", type="primary", use_container_width=True)
     
@@ -302,6 +559,7 @@ def main():
             # First time clicking with previous results - clear and store intent
             st.session_state.clear()
             st.session_state.run_analysis = True  # Store intent for next run
+            st.session_state.debug = debug  # Keep the debug toggle across the reset
             st.rerun()
         
         # Clear the stored intent (we're about to run analysis)
@@ -316,7 +574,11 @@ def main():
             # Step 1: Get audit logs
             status_text.text("Getting audit logs...")
             progress_bar.progress(50)
-            audit_logs = get_audit_logs(namespace, date_range, report_type, email_filter)
+            try:
+                audit_logs = get_audit_logs(namespace, date_range, report_type, email_filter, debug)
+            except AuditLogFetchError:
+                # The error has already been shown
+                st.stop()
             
             if not audit_logs:
                 st.warning("No audit logs found for the specified criteria.")
@@ -325,29 +587,27 @@ def main():
             # Step 2: Process data
             status_text.text("Processing data...")
             progress_bar.progress(75)
-            print(f"[AUDIT LOG] Processing {len(audit_logs)} audit log entries for {report_type}")
+            logger.debug("Processing %d audit log entries for %s", len(audit_logs), report_type)
             
-            if report_type == "User Navigation":
-                df = process_ui_telemetry_data(audit_logs)
-            else:  # User Actions
-                df = process_user_telemetry_data(audit_logs)
+            df = process_audit_logs(audit_logs, report_type, audit_logs_digest(audit_logs))
             
-            print(f"[AUDIT LOG] Processed data into {len(df)} records")
+            logger.debug("Processed data into %d records", len(df))
             
             # Step 3: Save data
             status_text.text("Saving data...")
             progress_bar.progress(90)
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             output_dir = f"generated_reports/{namespace}_audit_logs_{timestamp}"
-            save_data(audit_logs, df, output_dir, report_type)
+            save_data(audit_logs, df, output_dir, report_type, debug)
             
             # Complete progress
             progress_bar.progress(100)
             status_text.text("Analysis completed!")
             st.success("✅ Analysis completed successfully!")
             
-            # Store results in session state
-            st.session_state.current_results = {
+            # Store results under a fresh token; session state only keeps the token
+            token = uuid.uuid4().hex
+            _get_analysis(token).update({
                 'audit_logs': audit_logs,
                 'df': df,
                 'output_dir': output_dir,
@@ -355,7 +615,8 @@ def main():
                 'report_type': report_type,
                 'date_range': date_range,
                 'email_filter': email_filter
-            }
+            })
+            st.session_state.analysis_token = token
             st.session_state.show_results = True
             
             # Reset filter state for new data
@@ -374,9 +635,9 @@ def main():
             st.exception(e)
             st.stop()
     
-    # Display results from session state
-    if st.session_state.show_results and st.session_state.current_results:
-        results = st.session_state.current_results
+    # Display results for the session's analysis token (empty if it has been evicted)
+    results = _get_analysis(st.session_state.analysis_token) if st.session_state.analysis_token else None
+    if st.session_state.show_results and results:
         
         # Display results in the main content container
         with main_content:
@@ -401,8 +662,8 @@ def main():
             st.markdown("## 📋 Audit Log Data")
             
             if not results['df'].empty:
-                # Create filtered dataframe
-                filtered_df = create_filtered_dataframe(results['df'])
+                # The processed frame is displayed and filtered as-is, never modified
+                filtered_df = results['df']
                 
                 # Add filtering controls
                 st.markdown("### 🔍 Filter Data")
@@ -415,11 +676,12 @@ def main():
                     key="search_input"
                 )
                 
+                dropdown_options = _dropdown_options(st.session_state.analysis_token)
                 col1, col2, col3 = st.columns(3)
                 
                 with col1:
                     # Event filter
-                    unique_events = [''] + sorted(filtered_df['event'].unique().tolist())
+                    unique_events = dropdown_options['event']
                     selected_event = st.selectbox(
                         "Filter by Event", 
                         unique_events,
@@ -429,7 +691,7 @@ def main():
                 
                 with col2:
                     # Email filter
-                    unique_emails = [''] + sorted([email for email in filtered_df['email'].unique() if email])
+                    unique_emails = dropdown_options['email']
                     selected_email = st.selectbox(
                         "Filter by Email", 
                         unique_emails,
@@ -439,7 +701,7 @@ def main():
                 
                 with col3:
                     # Namespace filter
-                    unique_namespaces = [''] + sorted(filtered_df['namespace'].unique().tolist())
+                    unique_namespaces = dropdown_options['namespace']
                     selected_namespace = st.selectbox(
                         "Filter by Namespace", 
                         unique_namespaces,
@@ -455,28 +717,24 @@ def main():
                     'selected_namespace': selected_namespace
                 })
                 
-                # Apply filters
-                display_df = filtered_df.copy()
+                # Combine all filters into one mask so the frame is sliced only once
+                mask = pd.Series(True, index=filtered_df.index)
                 
                 if selected_event:
-                    display_df = display_df[display_df['event'] == selected_event]
+                    mask &= filtered_df['event'].eq(selected_event)
                 
                 if selected_email:
-                    display_df = display_df[display_df['email'] == selected_email]
+                    mask &= filtered_df['email'].eq(selected_email)
                 
                 if selected_namespace:
-                    display_df = display_df[display_df['namespace'] == selected_namespace]
+                    mask &= filtered_df['namespace'].eq(selected_namespace)
                 
-                # Apply search filter
                 if search_term:
-                    # Search across all string columns
-                    search_mask = pd.Series([False] * len(display_df))
-                    for col in display_df.columns:
-                        if display_df[col].dtype == 'object':  # String columns
-                            search_mask |= display_df[col].astype(str).str.contains(
-                                search_term, case=False, na=False
-                            )
-                    display_df = display_df[search_mask]
+                    # Search across all string columns in one pass over the pre-joined row text
+                    search_text = get_search_text(st.session_state.analysis_token)
+                    mask &= search_text.str.contains(search_term.upper(), regex=False, na=False)
+                
+                display_df = filtered_df[mask] if not mask.all() else filtered_df
                 
                 # Show filter results and clear button
                 col1, col2 = st.columns([3, 1])
@@ -497,9 +755,26 @@ def main():
                         }
                         st.rerun()
                 
-                # Display the filtered dataframe
+                # Only the current page is serialized and sent to the browser
+                page_count = max(1, -(-len(display_df) // DISPLAY_PAGE_SIZE))
+                if st.session_state.get('display_page', 1) > page_count:
+                    st.session_state.display_page = 1
+                if page_count > 1:
+                    page = st.number_input(
+                        f"Page (of {page_count})",
+                        min_value=1,
+                        max_value=page_count,
+                        step=1,
+                        key="display_page"
+                    )
+                else:
+                    page = 1
+                page_start = (page - 1) * DISPLAY_PAGE_SIZE
+                page_df = display_df.iloc[page_start:page_start + DISPLAY_PAGE_SIZE]
+                
+                # Display the current page of the filtered dataframe
                 st.dataframe(
-                    display_df,
+                    serialize_json_columns(page_df),
                     use_container_width=True,
                     height=600,
                     column_config={
@@ -535,12 +810,16 @@ def main():
                 st.markdown("## 💾 Export Data")
                 
                 # Get the current filtered data (what's visible in the table)
-                csv_data = display_df.to_csv(index=False)
+                csv_data = to_csv_bytes(display_df)
                 
                 st.download_button(
                     label="📥 Download CSV",
                     data=csv_data,
-                    file_name=f"audit_logs_{results['report_type'].lower().replace(' ', '_')}_{results['namespace']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                    file_name=DOWNLOAD_FILENAME_TEMPLATE.format(
+                        slug=REPORT_SLUG[results['report_type']],
+                        namespace=results['namespace'],
+                        timestamp=datetime.now().strftime('%Y%m%d_%H%M%S')
+                    ),
                     mime="text/csv",
                     use_container_width=True
                 )
@@ -550,11 +829,13 @@ def main():
                 
                 # Show file structure
                 with st.expander("📁 Generated Files"):
+                    slug = REPORT_SLUG[results['report_type']]
                     st.code(f"""
 {results['output_dir']}/
 ├── data/
-│   ├── raw_audit_logs_{results['report_type'].lower().replace(' ', '_')}.json
-│   └── processed_audit_logs_{results['report_type'].lower().replace(' ', '_')}.csv
+│   ├── raw_audit_logs_{slug}.json
+│   ├── processed_audit_logs_{slug}.csv
+│   └── processed_audit_logs_{slug}.parquet
 └── (Streamlit app data)
                     """)
                 
@@ -562,11 +843,15 @@ def main():
                 st.warning("No data to display")
             
             # Show sample of raw data for debugging
-            with st.expander("🔍 Raw Data Sample (First Entry)"):
-                if results['audit_logs']:
-                    st.json(results['audit_logs'][0])
-                else:
-                    st.info("No raw data available")
+            if debug:
+                with st.expander("🔍 Raw Data Sample (First Entry)"):
+                    if results['audit_logs']:
+                        st.json(results['audit_logs'][0])
+                    else:
+                        st.info("No raw data available")
+    elif st.session_state.show_results:
+        with main_content:
+            st.info("Previous results are no longer available. Click 'Generate Report' to run the analysis again.")
 
 
 if __name__ == "__main__":
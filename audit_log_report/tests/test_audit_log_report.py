@@ -0,0 +1,110 @@
+import pandas as pd
+import pytest
+
+from audit_log_report.main import (
+    _get_analysis,
+    get_search_text,
+    process_ui_telemetry_data,
+    process_user_telemetry_data,
+    save_data,
+    to_csv_bytes,
+)
+
+
+def _ui_log(events):
+    return {
+        "spec": {
+            "claims": ["email=dev@example.com", "domain=example.com"],
+            "payload": {
+                "tenant_meta": {"namespace": "acme"},
+                "spec": {
+                    "events": events,
+                    "device_user_agent": {"browser_name": "Firefox", "os_name": "Linux"},
+                },
+            },
+        }
+    }
+
+
+def _user_log(event_store):
+    return {
+        "spec": {
+            "claims": ["email=dev@example.com"],
+            "payload": {
+                "tenant_meta": {"namespace": "acme.child"},
+                "meta": {"create_time": "2026-10-15T10:00:00Z"},
+                "spec": {"event_store": event_store},
+            },
+        }
+    }
+
+
+@pytest.fixture
+def ui_df():
+    return process_ui_telemetry_data([
+        _ui_log([
+            {"timestamp": "2026-10-15T10:00:00Z", "key": "nav", "value": {"page": "/projects", "tab": "a,b"}},
+            {"timestamp": "2026-10-15T10:00:01Z", "key": "click", "value": 'say "hi"'},
+            {"timestamp": "2026-10-15T10:00:02Z", "key": "blank", "value": ""},
+        ]),
+    ])
+
+
+@pytest.fixture
+def user_df():
+    return process_user_telemetry_data([
+        _user_log({
+            "count": {"value": 3, "timestamp": 1760522400},
+            "label": {"value": "three", "timestamp": "2026-10-15T10:00:00Z", "properties": {"k": [1, 2]}},
+        }),
+    ])
+
+
+# --- to_csv_bytes ---
+
+def test_to_csv_bytes_keeps_dict_values(ui_df):
+    assert isinstance(ui_df["value"][0], dict)
+    assert b"\"{'page': '/projects', 'tab': 'a,b'}\"" in to_csv_bytes(ui_df)
+
+
+def test_to_csv_bytes_formats_dates_like_pandas(ui_df):
+    assert b"2026-10-15 10:00:00+00:00" in to_csv_bytes(ui_df)
+
+
+def test_to_csv_bytes_handles_mixed_int_and_str_columns(user_df):
+    rows = to_csv_bytes(user_df).decode().splitlines()
+    assert len(rows) == 3
+    assert ",count,3,1760522400," in rows[1]
+
+
+# --- save_data ---
+
+@pytest.mark.parametrize("report_type", ["User Navigation", "User Actions"])
+def test_save_data_writes_csv_and_parquet(tmp_path, ui_df, user_df, report_type):
+    df = ui_df if report_type == "User Navigation" else user_df
+    save_data([], df, str(tmp_path), report_type)
+    csv_files = list((tmp_path / "data").glob("processed_audit_logs_*.csv"))
+    parquet_files = list((tmp_path / "data").glob("processed_audit_logs_*.parquet"))
+    assert len(csv_files) == 1 and len(parquet_files) == 1
+    assert csv_files[0].read_bytes() == to_csv_bytes(df)
+    assert len(pd.read_parquet(parquet_files[0])) == len(df)
+
+
+def test_save_data_stores_mixed_values_as_strings_in_parquet(tmp_path, ui_df, user_df):
+    save_data([], ui_df, str(tmp_path / "ui"), "User Navigation")
+    save_data([], user_df, str(tmp_path / "user"), "User Actions")
+    ui = pd.read_parquet(next((tmp_path / "ui" / "data").glob("*.parquet")))
+    user = pd.read_parquet(next((tmp_path / "user" / "data").glob("*.parquet")))
+    assert ui["value"].tolist() == ["{'page': '/projects', 'tab': 'a,b'}", 'say "hi"', ""]
+    assert user["value"].tolist() == ["3", "three"]
+    assert user["properties"].tolist() == ["{}", '{"k": [1, 2]}']
+
+
+# --- get_search_text ---
+
+def test_get_search_text_is_kept_with_the_analysis_results(ui_df):
+    _get_analysis("token-a")["df"] = ui_df
+    search_text = get_search_text("token-a")
+    assert get_search_text("token-a") is search_text
+    assert _get_analysis("token-a")["search_text"] is search_text
+    assert search_text.str.contains("SAY \"HI\"", regex=False).tolist() == [False, True, False]
@@ -1,15 +1,38 @@
 #!/usr/bin/env python3
 import argparse
+import fnmatch
+import functools
 import json
 import os
 import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import subprocess
 import shlex
 
+try:
+	import re2
+	RE2_SUPPORT = True
+except ImportError:
+	RE2_SUPPORT = False
+
+try:
+	import orjson
+	ORJSON_SUPPORT = True
+except ImportError:
+	ORJSON_SUPPORT = False
+
+
+# PackageVersions requested per endorctl list call
+PACKAGE_VERSION_PAGE_SIZE = 500
+
+# Fields requested when listing PackageVersions: everything _parse_package_version_node
+# reads, including spec.relative_path so listed items rarely need a follow-up get.
+PACKAGE_VERSION_LIST_MASK = "uuid,meta,tenant_meta,spec.project_uuid,spec.relative_path"
+
 
 @dataclass
 class PackageVersionInfo:
@@ -24,38 +47,45 @@ class PackageVersionInfo:
 	matched_pattern: Optional[str] = None
 
 
+def loads_json(data: bytes) -> Any:
+	"""Parse JSON bytes, using orjson when it is installed."""
+	if ORJSON_SUPPORT:
+		return orjson.loads(data)
+	return json.loads(data)
+
+
 class EndorClient:
 	def __init__(self, timeout_seconds: int = 30, debug: bool = False) -> None:
 		self.timeout_seconds = timeout_seconds
 		self.debug = debug
 
 	def _run_endorctl(self, args: List[str], *, parse_json: bool = True) -> Any:
-		cmd = " ".join(shlex.quote(a) for a in ["endorctl", *args])
+		cmd = ["endorctl", *args]
 		if self.debug:
-			print(f"DEBUG endorctl: {cmd}")
+			print(f"DEBUG endorctl: {shlex.join(cmd)}")
 		proc = subprocess.run(
 			cmd,
-			shell=True,
 			stdout=subprocess.PIPE,
 			stderr=subprocess.PIPE,
-			text=True,
 			timeout=self.timeout_seconds,
 		)
+		# stdout stays bytes so large list responses go straight to the JSON parser without a decode pass
+		stderr = proc.stderr.decode(errors="replace").strip()
 		if self.debug:
 			print(f"DEBUG endorctl exit={proc.returncode}")
-			if proc.stderr:
-				print(f"DEBUG endorctl stderr: {proc.stderr.strip()[:2000]}")
+			if stderr:
+				print(f"DEBUG endorctl stderr: {stderr[:2000]}")
 		if proc.returncode != 0:
-			raise RuntimeError(f"endorctl failed: {proc.stderr.strip() or proc.stdout.strip()} (code {proc.returncode})")
+			raise RuntimeError(f"endorctl failed: {stderr or proc.stdout.decode(errors='replace').strip()} (code {proc.returncode})")
 		out = proc.stdout.strip()
 		if not parse_json:
-			return out
+			return out.decode(errors="replace")
 		if not out:
 			return None
 		try:
-			return json.loads(out)
-		except json.JSONDecodeError as exc:
-			raise RuntimeError(f"Failed to parse endorctl JSON output: {exc}: {out[:2000]}")
+			return loads_json(out)
+		except ValueError as exc:
+			raise RuntimeError(f"Failed to parse endorctl JSON output: {exc}: {out[:2000].decode(errors='replace')}")
 
 	# ------------------------
 	# Scan profile retrieval via endorctl
@@ -107,33 +137,45 @@ class EndorClient:
 	# ------------------------
 	# PackageVersion listing via endorctl
 	# ------------------------
-	def list_package_versions(self, namespace: str, project_uuid: Optional[str]) -> Iterable["PackageVersionInfo"]:
-		filter_expr = "context.type==CONTEXT_TYPE_MAIN"
+	def list_package_versions(self, namespace: str, project_uuid: Optional[str]) -> Iterator["PackageVersionInfo"]:
+		"""Yield PackageVersions one page at a time, so callers can work on a page while the next is fetched."""
+		# PackageVersions without a relative_path can never match a pattern, so leave them out server-side
+		filter_expr = 'context.type==CONTEXT_TYPE_MAIN and spec.relative_path != ""'
 		if project_uuid:
 			filter_expr += f" and spec.project_uuid=={project_uuid}"
-		args = [
+		base_args = [
 			"-n", namespace,
 			"api", "list",
 			"-r", "PackageVersion",
-			"--list-all",
+			f"--page-size={PACKAGE_VERSION_PAGE_SIZE}",
 			f"--filter={filter_expr}",
+			f"--field-mask={PACKAGE_VERSION_LIST_MASK}",
 		]
-		data = self._run_endorctl(args, parse_json=True)
-		items: List[Dict[str, Any]] = []
-		if isinstance(data, dict):
-			lst = data.get("list")
-			if isinstance(lst, dict):
-				objs = lst.get("objects")
-				if isinstance(objs, list):
-					items = objs
-		# Fallbacks for other shapes if needed
-		if not items:
-			if isinstance(data, list):
-				items = data
-			elif isinstance(data, dict):
-				items = data.get("items", []) or data.get("results", []) or data.get("nodes", []) or []
-		for node in items:
-			yield self._parse_package_version_node(node)
+		page_token: Optional[str] = None
+		while True:
+			args = base_args + ([f"--page-token={page_token}"] if page_token else [])
+			data = self._run_endorctl(args, parse_json=True)
+			items: List[Dict[str, Any]] = []
+			page_token = None
+			if isinstance(data, dict):
+				lst = data.get("list")
+				if isinstance(lst, dict):
+					objs = lst.get("objects")
+					if isinstance(objs, list):
+						items = objs
+					response = lst.get("response")
+					if isinstance(response, dict):
+						page_token = response.get("next_page_token") or None
+			# Fallbacks for other shapes if needed
+			if not items:
+				if isinstance(data, list):
+					items = data
+				elif isinstance(data, dict):
+					items = data.get("items", []) or data.get("results", []) or data.get("nodes", []) or []
+			for node in items:
+				yield self._parse_package_version_node(node)
+			if not page_token:
+				break
 
 	@staticmethod
 	def _parse_package_version_node(node: Dict[str, Any]) -> "PackageVersionInfo":
@@ -199,6 +241,11 @@ class PatternMatcher:
 	def __init__(self, patterns: List[str], debug: bool = False) -> None:
 		self._compiled: List[Tuple[str, Any]] = []
 		self.debug = debug
+		suffixes: List[str] = []
+		substrings: List[str] = []
+		regex_patterns: List[str] = []
+		# Every distinct compiled pattern in order, with the display pattern it reports as
+		ordered: Dict[str, str] = {}
 		for p in patterns:
 			p = self._normalize_pattern(p)
 			if not p:
@@ -214,51 +261,118 @@ class PatternMatcher:
 					# while compiling the relaxed matcher.
 					compile_specs.append((p, without_globstar))
 			for display_pat, compile_pat in compile_specs:
-				regex = self._translate_glob_to_regex(compile_pat)
-				self._compiled.append((display_pat, re.compile(regex)))
-
-	@staticmethod
-	def _translate_glob_to_regex(pat: str) -> str:
-		import fnmatch
-		return fnmatch.translate(pat)
+				self._compiled.append((display_pat, _compile_pattern(compile_pat)))
+				ordered.setdefault(compile_pat, display_pat)
+				literal = _literal_match(compile_pat)
+				if literal is None:
+					regex_patterns.append(compile_pat)
+				elif literal[0] == "suffix":
+					suffixes.append(literal[1])
+				else:
+					substrings.append(literal[1])
+		# Patterns that reduce to a plain suffix or substring test (e.g. "*.lock",
+		# "vendor/*") are checked with string operations; the rest are OR-ed into
+		# one regex. A path that matches none of them is rejected without
+		# searching each pattern's regex in turn.
+		self._suffixes = tuple(suffixes)
+		self._substrings = tuple(substrings)
+		self._combined: Optional[Any] = None
+		if regex_patterns:
+			self._combined = _compile_combined(tuple(_compile_pattern(p).pattern for p in regex_patterns))
+		# All patterns as named groups "_p<N>", for naming the first one that matches in one search
+		self._ordered_patterns = tuple(ordered.values())
+		self._ordered: Optional[Any] = None
+		if ordered:
+			self._ordered = _compile_combined(tuple(_compile_pattern(p).pattern for p in ordered), ordered=True)
 
 	def matches_any(self, path: str) -> Optional[str]:
-		path = self._normalize_path(path)
-		for pat, rgx in self._compiled:
-			matched = bool(rgx.search(path))
-			if self.debug:
+		return self.matches_any_normalized(self._normalize_path(path))
+
+	def matches_any_normalized(self, path: str) -> Optional[str]:
+		"""matches_any for a path that has already been through _normalize_path."""
+		if self.debug:
+			# Report every comparison up to the first match
+			for pat, rgx in self._compiled:
+				matched = bool(rgx.search(path))
 				print(f"DEBUG compare: pattern='{pat}' path='{path}' -> {matched}", flush=True)
-			if matched:
-				if not self.debug:
-					print(f"MATCH pattern='{pat}' path='{path}'", flush=True)
-				return pat
-		return None
+				if matched:
+					return pat
+			return None
+		if not self._may_match(path):
+			return None
+		m = self._ordered.search(path)
+		if m is None:
+			return None
+		pat = self._ordered_patterns[int(m.lastgroup[2:])]
+		print(f"MATCH pattern='{pat}' path='{path}'", flush=True)
+		return pat
+
+	def _may_match(self, path: str) -> bool:
+		if path.endswith(self._suffixes):
+			return True
+		if any(sub in path for sub in self._substrings):
+			return True
+		return self._combined is not None and self._combined.search(path) is not None
 
 	@staticmethod
 	def _normalize_path(path: str) -> str:
-		path = path.replace("\\", "/")
-		while path.startswith("./"):
-			path = path[2:]
-		if path.startswith("/"):
-			path = path[1:]
-		return path
+		return _LEADING_DOT_SLASH.sub("", path.replace("\\", "/"), count=1)
 
 	@staticmethod
 	def _normalize_pattern(pat: str) -> str:
-		pat = (pat or "").strip()
-		pat = pat.replace("\\", "/")
-		while pat.startswith("./"):
-			pat = pat[2:]
-		if pat.startswith("/"):
-			pat = pat[1:]
-		return pat
+		return _LEADING_DOT_SLASH.sub("", (pat or "").strip().replace("\\", "/"), count=1)
+
+
+# Any number of leading "./" segments followed by at most one "/"
+_LEADING_DOT_SLASH = re.compile(r"^(?:\./)*/?")
+
+_GLOB_META = re.compile(r"[*?\[]")
+
+
+def _literal_match(pat: str) -> Optional[Tuple[str, str]]:
+	"""Return ("suffix", s) or ("substring", s) when the glob is a plain string test, else None.
+
+	Patterns are searched unanchored at the start and anchored at the end, so
+	"*<literal>" (or a bare literal) matches paths ending with the literal and
+	"<literal>*" matches paths containing it.
+	"""
+	head = pat.lstrip("*")
+	if not _GLOB_META.search(head):
+		return "suffix", head
+	tail = pat.rstrip("*")
+	if not _GLOB_META.search(tail):
+		return "substring", tail
+	return None
+
+
+@functools.lru_cache(maxsize=None)
+def _compile_pattern(pat: str) -> "re.Pattern[str]":
+	"""Translate and compile a normalized glob; each distinct pattern is compiled once."""
+	return re.compile(fnmatch.translate(pat))
 
 
-def fnmatch_translate_posix(pat: str) -> str:
-	import fnmatch
+@functools.lru_cache(maxsize=None)
+def _compile_combined(regexes: Tuple[str, ...], ordered: bool = False) -> Any:
+	"""Compile the alternation of already-translated pattern regexes, once per distinct pattern list.
 
-	regex = fnmatch.translate(pat)
-	return regex
+	With ordered=True each regex becomes the named group "_p<index>" and the alternation is
+	anchored at the start, so every branch is tried against the whole path before the next one
+	and the match's lastgroup names the first regex in order that matches (not the leftmost).
+
+	Uses RE2 (linear-time, no backtracking) when google-re2 is installed, falling back to re.
+	"""
+	if ordered:
+		combined = "^(?:" + "|".join(f"(?s:.*?)(?P<_p{i}>{regex})" for i, regex in enumerate(regexes)) + ")"
+	else:
+		combined = "|".join(f"(?:{regex})" for regex in regexes)
+	if RE2_SUPPORT:
+		# fnmatch emits atomic groups and \Z, which RE2 spells (?:...) and \z; patterns are
+		# normalized to "/" separators, so neither sequence can come from an escaped literal.
+		try:
+			return re2.compile(combined.replace("(?>", "(?:").replace("\\Z", "\\z"))
+		except re2.error:
+			pass
+	return re.compile(combined)
 
 
 # ------------------------
@@ -297,6 +411,12 @@ def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
 		default=int(os.environ.get("ENDOR_API_TIMEOUT", "30")),
 		help="Command timeout in seconds (default: 30)",
 	)
+	parser.add_argument(
+		"--workers",
+		type=int,
+		default=8,
+		help="Number of concurrent endorctl calls when fetching missing relative paths (default: 8)",
+	)
 	parser.add_argument(
 		"--debug",
 		action="store_true",
@@ -338,28 +458,18 @@ def main(argv: Optional[List[str]] = None) -> int:
 		print(f"Retrieving package_versions for project with uuid: {args.project_uuid}")
 	else:
 		print("Retrieving package_versions for all projects")
-	pvs = list(client.list_package_versions(args.namespace, args.project_uuid))
-	print(f"Found {len(pvs)} package_versions")
 	# Hydrate dependency_files by fetching full objects when list output lacks them
-	for i, pv in enumerate(pvs):
-		if not pv.relative_path:
-			try:
-				if args.debug:
-					print(f"DEBUG hydrating relative_path for pv uuid={pv.uuid or pv.id}", flush=True)
-				full_pv = client.get_package_version_by_uuid(args.namespace, (pv.uuid or pv.id or ""))
-				pvs[i] = full_pv
-			except Exception as exc:
-				if args.debug:
-					print(f"DEBUG failed to hydrate pv uuid={pv.uuid or pv.id}: {exc}", flush=True)
-				# keep original pv if hydration fails
+	def hydrate(pv: PackageVersionInfo) -> Tuple[Optional[PackageVersionInfo], Optional[Exception]]:
+		try:
+			return client.get_package_version_by_uuid(args.namespace, (pv.uuid or pv.id or "")), None
+		except Exception as exc:
+			return None, exc
 
-	matches: List[PackageVersionInfo] = []
-	total = 0
-	print("Checking package_versions against excluded_path patterns")
-	for pv in pvs:
-		total += 1
+	matched: List[Tuple[int, PackageVersionInfo]] = []
+
+	def check(index: int, pv: PackageVersionInfo) -> None:
 		if args.project_uuid and (pv.spec_project_uuid != args.project_uuid):
-			continue
+			return
 		path = pv.relative_path or ""
 		if not path:
 			if args.debug:
@@ -367,13 +477,44 @@ def main(argv: Optional[List[str]] = None) -> int:
 				uid = pv.uuid or pv.id or "<unknown>"
 				name = pv.name or "<unnamed>"
 				print(f"DEBUG pv namespace={ns} uuid={uid} name=\"{name}\" has empty relative_path", flush=True)
-			continue
+			return
 		if args.debug:
 			print(f"DEBUG check relative_path='{path}'", flush=True)
-		matched_pat = matcher.matches_any(path)
+		matched_pat = matcher.matches_any_normalized(PatternMatcher._normalize_path(path))
 		if matched_pat:
 			pv.matched_pattern = matched_pat
-			matches.append(pv)
+			matched.append((index, pv))
+
+	# PackageVersions are checked as pages arrive; those without a relative_path are
+	# hydrated in the background and checked once listing completes.
+	total = 0
+	pending: List[Tuple[int, PackageVersionInfo, Any]] = []
+	print("Checking package_versions against excluded_path patterns")
+	with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+		for index, pv in enumerate(client.list_package_versions(args.namespace, args.project_uuid)):
+			total += 1
+			if args.project_uuid and pv.spec_project_uuid is not None and pv.spec_project_uuid != args.project_uuid:
+				# Known to belong to another project: skip before paying for hydration
+				continue
+			if pv.relative_path:
+				check(index, pv)
+			else:
+				pending.append((index, pv, executor.submit(hydrate, pv)))
+		print(f"Found {total} package_versions")
+		for index, pv, future in pending:
+			if args.debug:
+				print(f"DEBUG hydrating relative_path for pv uuid={pv.uuid or pv.id}", flush=True)
+			full_pv, exc = future.result()
+			if exc is not None:
+				if args.debug:
+					print(f"DEBUG failed to hydrate pv uuid={pv.uuid or pv.id}: {exc}", flush=True)
+				# keep original pv if hydration fails
+			else:
+				pv = full_pv
+			check(index, pv)
+
+	# Report matches in listing order
+	matches = [pv for _, pv in sorted(matched, key=lambda item: item[0])]
 
 	# Step 3/4: Print and optionally delete
 	if not matches:
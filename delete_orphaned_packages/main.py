@@ -1,7 +1,12 @@
+import functools
+import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 import os
 import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
 # Load the environment variables from the .env file
@@ -11,7 +16,24 @@ load_dotenv()
 ENDOR_NAMESPACE = os.getenv("ENDOR_NAMESPACE")
 API_URL = 'https://api.endorlabs.com/v1'
 
-def get_token():
+# Objects requested per page when listing projects and package versions
+PAGE_SIZE = 500
+
+# Stand-in for the page token when pre-serializing the package query
+PAGE_TOKEN_PLACEHOLDER = "__page_token__"
+
+# Number of package deletions in flight at once
+DELETE_WORKERS = 16
+
+def create_session():
+    """Create a Session whose connections are reused across every API call, with retries on transient errors."""
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=DELETE_WORKERS, pool_maxsize=DELETE_WORKERS, max_retries=retry)
+    session.mount("https://", adapter)
+    return session
+
+def get_token(session):
     api_key = os.getenv("API_KEY")
     api_secret = os.getenv("API_SECRET")
     url = f"{API_URL}/auth/api-key"
@@ -24,7 +46,7 @@ def get_token():
         "Request-Timeout": "60"
     }
 
-    response = requests.post(url, json=payload, headers=headers, timeout=60)
+    response = session.post(url, json=payload, headers=headers, timeout=60)
     
     if response.status_code == 200:
         token = response.json().get('token')
@@ -32,18 +54,26 @@ def get_token():
     else:
         raise Exception(f"Failed to get token: {response.status_code}, {response.text}")
 
-API_TOKEN = get_token()
-HEADERS = {
-    "User-Agent": "curl/7.68.0",
-    "Accept": "*/*",
-    "Authorization": f"Bearer {API_TOKEN}",
-    "Request-Timeout": "600"  # Set the request timeout to 60 seconds
-}
+@functools.lru_cache(maxsize=None)
+def api_session():
+    """Return the shared authenticated Session, exchanging the API key for a token on first use.
+
+    Deferred until the first API call so that importing the module or running --help needs no credentials.
+    """
+    session = create_session()
+    api_token = get_token(session)
+    session.headers.update({
+        "User-Agent": "curl/7.68.0",
+        "Accept": "*/*",
+        "Authorization": f"Bearer {api_token}",
+        "Request-Timeout": "600"  # Set the request timeout to 60 seconds
+    })
+    return session
 
 def get_orphaned_packages_uuid():
     print("Getting projects UUIDs...")
     projects = get_all_projects()
-    project_uuids = [project.get("uuid") for project in projects]
+    project_uuids = {project.get("uuid") for project in projects}
     print("Fetching orphaned packages...")
     query_data = {
         "tenant_meta": {
@@ -58,6 +88,7 @@ def get_orphaned_packages_uuid():
                 "list_parameters": {
                     "filter": "context.type==CONTEXT_TYPE_MAIN",
                     "mask": "uuid,spec.project_uuid,tenant_meta",
+                    "page_size": PAGE_SIZE,
                     "traverse": True
                 }
             }
@@ -68,20 +99,25 @@ def get_orphaned_packages_uuid():
     url = f"{API_URL}/namespaces/{ENDOR_NAMESPACE}/queries"
     print(f"POST Request to URL: {url}")
 
+    # Serialize the query once; later pages only splice their page token into it
+    first_page_body = json.dumps(query_data)
+    query_data["spec"]["query_spec"]["list_parameters"]["page_token"] = PAGE_TOKEN_PLACEHOLDER
+    body_prefix, body_suffix = json.dumps(query_data).split(json.dumps(PAGE_TOKEN_PLACEHOLDER))
+    json_headers = {"Content-Type": "application/json"}
+
     orphaned_packages = []
     next_page_id = None
 
     try:
         while True:
-            if next_page_id:
-                query_data["spec"]["query_spec"]["list_parameters"]["page_token"] = next_page_id
+            body = body_prefix + json.dumps(next_page_id) + body_suffix if next_page_id else first_page_body
 
             # Make the POST request to the queries endpoint
-            response = requests.post(url, headers=HEADERS, json=query_data, timeout=600)
+            response = api_session().post(url, data=body, headers=json_headers, timeout=600)
 
             if response.status_code != 200:
                 print(f"Failed to fetch orphaned packages. Status Code: {response.status_code}, Response: {response.text}")
-                return []
+                return [], project_uuids
 
             # Parse the response data
             response_data = response.json()
@@ -102,11 +138,11 @@ def get_orphaned_packages_uuid():
             if not next_page_id:
                 break
 
-        return list(orphaned_packages)
+        return orphaned_packages, project_uuids
 
     except requests.RequestException as e:
         print(f"An error occurred while fetching orphaned packages: {e}")
-        return []
+        return [], project_uuids
 
 
 def get_all_projects():
@@ -116,6 +152,7 @@ def get_all_projects():
     print(f"URL: {url}")
     
     params = {'list_parameters.mask': 'uuid',
+              'list_parameters.page_size': PAGE_SIZE,
               'list_parameters.traverse': True}
     
     projects_list = []
@@ -125,7 +162,7 @@ def get_all_projects():
         if next_page_id:
             params['list_parameters.page_id'] = next_page_id
 
-        response = requests.get(url, headers=HEADERS, params=params, timeout=600)
+        response = api_session().get(url, params=params, timeout=600)
 
         if response.status_code != 200:
             print(f"Failed to get projects, Status Code: {response.status_code}, Response: {response.text}")
@@ -146,45 +183,40 @@ def get_all_projects():
     print(f"Total projects fetched: {len(projects_list)}")
     return projects_list
 
-def get_project(project_uuid):
-    url = f"{API_URL}/namespaces/{ENDOR_NAMESPACE}/projects/{project_uuid}"
-    response = requests.get(url, headers=HEADERS, timeout=60)
-    if response.status_code == 200:
-        return True
-    else:
-        return False
-
-def delete_orphaned_packages(orphaned_packages):
-    print("Deleting orphaned packages...")
-    for package in orphaned_packages:
-        package_uuid = package.get("uuid")
-        project_uuid = package.get("spec", {}).get("project_uuid")
-        tenant_name = package.get("tenant_meta", {}).get("namespace")
-
-        if not get_project(project_uuid) and package_uuid and tenant_name:
-            url = f"{API_URL}/namespaces/{tenant_name}/package-versions/{package_uuid}"
-            try:
-                print(f"Deleting package with UUID: {package_uuid}")
-                response = requests.delete(url, headers=HEADERS, timeout=60)
-                if response.status_code == 200:
-                    print(f"Successfully deleted package with UUID: {package_uuid}")
-                else:
-                    print(f"Failed to delete package with UUID: {package_uuid}. Status Code: {response.status_code}, Response: {response.text}")
-            except requests.RequestException as e:
-                print(f"An error occurred while deleting package with UUID: {package_uuid}: {e}")
-        else:
-            print(f"Skipping package with UUID: {package_uuid}, as it is part of a project.")
+def _delete_one(package, project_uuids):
+    """Delete a single orphaned package version and return a message describing the outcome."""
+    package_uuid = package.get("uuid")
+    project_uuid = package.get("spec", {}).get("project_uuid")
+    tenant_name = package.get("tenant_meta", {}).get("namespace")
+
+    if project_uuid not in project_uuids and package_uuid and tenant_name:
+        url = f"{API_URL}/namespaces/{tenant_name}/package-versions/{package_uuid}"
+        try:
+            response = api_session().delete(url, timeout=60)
+            if response.status_code == 200:
+                return f"Successfully deleted package with UUID: {package_uuid}"
+            return f"Failed to delete package with UUID: {package_uuid}. Status Code: {response.status_code}, Response: {response.text}"
+        except requests.RequestException as e:
+            return f"An error occurred while deleting package with UUID: {package_uuid}: {e}"
+    return f"Skipping package with UUID: {package_uuid}, as it is part of a project."
+
+def delete_orphaned_packages(orphaned_packages, project_uuids):
+    print(f"Deleting orphaned packages ({DELETE_WORKERS} at a time)...")
+    with ThreadPoolExecutor(max_workers=DELETE_WORKERS) as executor:
+        futures = [executor.submit(_delete_one, package, project_uuids) for package in orphaned_packages]
+        for future in as_completed(futures):
+            print(future.result())
 
 def main():
     parser = argparse.ArgumentParser(description="Fetch and delete orphaned packages.")
     parser.add_argument('--no-dry-run', action='store_true', help="Fetch and delete orphaned packages.")
     args = parser.parse_args()
 
-    orphaned_packages = get_orphaned_packages_uuid()
+    orphaned_packages, project_uuids = get_orphaned_packages_uuid()
     print(f"Found {len(orphaned_packages)} orphaned packages.")
 
     if args.no_dry_run:
-        delete_orphaned_packages(orphaned_packages)
+        delete_orphaned_packages(orphaned_packages, project_uuids)
     else:
         print("Dry run mode: No packages will be deleted. To delete orphaned packages, run the script with the --no-dry-run flag.")
 
@@ -1,19 +1,123 @@
+import base64
+import collections
+import hashlib
+import json
+import logging
+import sys
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 import os
 import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+try:
+    import orjson
+    ORJSON_SUPPORT = True
+except ImportError:
+    ORJSON_SUPPORT = False
 
 
 # Load the environment variables from the .env file
 load_dotenv()
 
+# Per-package progress goes through the logger so it costs nothing when the level filters it out
+logger = logging.getLogger(__name__)
+logging.basicConfig(format="%(message)s", stream=sys.stdout)
+logger.setLevel(logging.INFO)
+
 # Get the API key and secret from environment variables
 ENDOR_NAMESPACE = os.getenv("ENDOR_NAMESPACE")
 API_URL = 'https://api.endorlabs.com/v1'
 
+# Objects requested per page when listing package versions
+PAGE_SIZE = 500
+
+# Number of package deletions in flight at once
+DELETE_WORKERS = 32
+
+# Seconds to wait for a connection to the API; reads get their own, longer timeout per call
+CONNECT_TIMEOUT = 5
+
+# Transient errors are retried up to this many times with exponential backoff, honouring
+# Retry-After. The package query is a read, so POST is retried along with GET and DELETE.
+RETRY_TOTAL = 5
+RETRY_METHODS = Retry.DEFAULT_ALLOWED_METHODS | {"POST"}
+
+# The fields of a listed package version that are used; the parsed JSON is not kept
+TestPackage = collections.namedtuple("TestPackage", "uuid namespace project_uuid relative_path")
+
+# On-disk cache of the API token, reused until TOKEN_EXPIRY_SKEW seconds before it expires
+TOKEN_CACHE_PATH = Path("~/.endor/token.json").expanduser()
+TOKEN_EXPIRY_SKEW = 60
+
+def loads_json(data):
+    """Parse JSON bytes, using orjson when it is installed."""
+    if ORJSON_SUPPORT:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps_json(obj):
+    """Serialize obj to JSON bytes, using orjson when it is installed."""
+    if ORJSON_SUPPORT:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode()
+
+def create_session():
+    """Create a Session whose connections are reused across every API call, with retries on transient errors."""
+    session = requests.Session()
+    retry = Retry(total=RETRY_TOTAL, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                  allowed_methods=RETRY_METHODS, raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=DELETE_WORKERS, max_retries=retry)
+    session.mount("https://", adapter)
+    return session
+
+SESSION = create_session()
+
+def _token_expiry(token):
+    """Return the exp claim of a JWT as epoch seconds, or None if it cannot be read."""
+    try:
+        payload = token.split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        return float(claims['exp'])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return None
+
+def read_cached_token(api_key):
+    """Return the cached token for api_key if it is valid for more than TOKEN_EXPIRY_SKEW seconds."""
+    try:
+        with open(TOKEN_CACHE_PATH) as f:
+            cached = json.load(f)
+        key_hash = hashlib.sha256((api_key or "").encode()).hexdigest()
+        if cached.get('key_sha256') == key_hash and time.time() < cached['exp'] - TOKEN_EXPIRY_SKEW:
+            return cached['token']
+    except (OSError, AttributeError, KeyError, TypeError, ValueError):
+        pass
+    return None
+
+def write_cached_token(api_key, token):
+    """Store the token for api_key in the cache (mode 0600), ignoring filesystem errors."""
+    exp = _token_expiry(token)
+    if exp is None:
+        return
+    try:
+        TOKEN_CACHE_PATH.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        tmp_path = TOKEN_CACHE_PATH.with_suffix(f".{os.getpid()}.tmp")
+        with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+            json.dump({'key_sha256': hashlib.sha256((api_key or "").encode()).hexdigest(), 'token': token, 'exp': exp}, f)
+        os.replace(tmp_path, TOKEN_CACHE_PATH)
+    except OSError as e:
+        print(f"Warning: could not write token cache {TOKEN_CACHE_PATH}: {e}")
+
 def get_token():
     api_key = os.getenv("API_KEY")
     api_secret = os.getenv("API_SECRET")
+    token = read_cached_token(api_key)
+    if token:
+        return token
     url = f"{API_URL}/auth/api-key"
     payload = {
         "key": api_key,
@@ -24,10 +128,11 @@ def get_token():
         "Request-Timeout": "60"
     }
 
-    response = requests.post(url, json=payload, headers=headers, timeout=60)
+    response = SESSION.post(url, json=payload, headers=headers, timeout=(CONNECT_TIMEOUT, 60))
     
     if response.status_code == 200:
-        token = response.json().get('token')
+        token = loads_json(response.content).get('token')
+        write_cached_token(api_key, token)
         return token
     else:
         raise Exception(f"Failed to get token: {response.status_code}, {response.text}")
@@ -39,6 +144,7 @@ HEADERS = {
     "Authorization": f"Bearer {API_TOKEN}",
     "Request-Timeout": "600"  # Set the request timeout to 60 seconds
 }
+SESSION.headers.update(HEADERS)
 
 def get_test_packages():
     print("Fetching test packages...")
@@ -54,7 +160,8 @@ def get_test_packages():
                 "kind": "PackageVersion",
                 "list_parameters": {
                     "filter": "context.type==CONTEXT_TYPE_MAIN and spec.relative_path matches '(?i).*(tests?|testing|test|testdata).*'",
-                    "mask": "uuid,spec.project_uuid,spec.relative_path,tenant_meta",
+                    "mask": "uuid,spec.project_uuid,spec.relative_path,tenant_meta.namespace",
+                    "page_size": PAGE_SIZE,
                     "traverse": True
                 }
             }
@@ -66,72 +173,99 @@ def get_test_packages():
     print(f"POST Request to URL: {url}")
     print(f"Using filter: {query_data['spec']['query_spec']['list_parameters']['filter']}")
 
+    json_headers = {"Content-Type": "application/json"}
+
+    def fetch_page(page_id):
+        if page_id:
+            query_data["spec"]["query_spec"]["list_parameters"]["page_token"] = page_id
+        # Make the POST request to the queries endpoint
+        return SESSION.post(url, data=dumps_json(query_data), headers=json_headers, timeout=(CONNECT_TIMEOUT, 600))
+
     test_packages = []
-    next_page_id = None
 
     try:
-        while True:
-            if next_page_id:
-                query_data["spec"]["query_spec"]["list_parameters"]["page_token"] = next_page_id
-
-            # Make the POST request to the queries endpoint
-            response = requests.post(url, headers=HEADERS, json=query_data, timeout=600)
+        # One page is always in flight: the next page is requested as soon as its token
+        # is known, and downloads while the current page is processed
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            pending = executor.submit(fetch_page, None)
+            while pending:
+                response = pending.result()
 
-            if response.status_code != 200:
-                print(f"Failed to fetch test packages. Status Code: {response.status_code}, Response: {response.text}")
-                return []
+                if response.status_code != 200:
+                    print(f"Failed to fetch test packages. Status Code: {response.status_code}, Response: {response.text}")
+                    return []
 
-            # Parse the response data
-            response_data = response.json()
-            packages = response_data.get("spec", {}).get("query_response", {}).get("list", {}).get("objects", [])
+                # Parse the response data
+                response_data = loads_json(response.content)
+                packages = response_data.get("spec", {}).get("query_response", {}).get("list", {}).get("objects", [])
 
-            # Process the results
-            for package in packages:
-                package_uuid = package.get("uuid")
-                tenant_name = package.get("tenant_meta", {}).get("namespace")
-                project_uuid = package.get("spec", {}).get("project_uuid")
-                relative_path = package.get("spec", {}).get("relative_path")
-                test_packages.append(package)
-                print(f"Found test package: {package_uuid}, tenant-name: {tenant_name}, project-uuid: {project_uuid}, relative_path: {relative_path}")
+                # Check for next page
+                next_page_id = response_data.get("spec", {}).get("query_response", {}).get("list", {}).get("response", {}).get("next_page_token")
+                pending = executor.submit(fetch_page, next_page_id) if next_page_id else None
 
-            # Check for next page
-            next_page_id = response_data.get("spec", {}).get("query_response", {}).get("list", {}).get("response", {}).get("next_page_token")
-            if not next_page_id:
-                break
+                # Process the results
+                for package in packages:
+                    package_uuid = package.get("uuid")
+                    tenant_name = package.get("tenant_meta", {}).get("namespace")
+                    project_uuid = package.get("spec", {}).get("project_uuid")
+                    relative_path = package.get("spec", {}).get("relative_path")
+                    test_packages.append(TestPackage(package_uuid, tenant_name, project_uuid, relative_path))
+                    logger.info("Found test package: %s, tenant-name: %s, project-uuid: %s, relative_path: %s",
+                                package_uuid, tenant_name, project_uuid, relative_path)
 
-        return list(test_packages)
+        return test_packages
 
-    except requests.RequestException as e:
+    except (requests.RequestException, ValueError) as e:
         print(f"An error occurred while fetching test packages: {e}")
         return []
 
 
+def _delete_one(package):
+    """Delete a single test package version, log the outcome and return whether it was deleted."""
+    package_uuid = package.uuid
+    tenant_name = package.namespace
+
+    if not (package_uuid and tenant_name):
+        logger.warning("Skipping package: Missing UUID or tenant name. Package details: %s", package)
+        return False
+
+    url = f"{API_URL}/namespaces/{tenant_name}/package-versions/{package_uuid}"
+    try:
+        response = SESSION.delete(url, timeout=(CONNECT_TIMEOUT, 60))
+    except requests.RequestException as e:
+        logger.error("An error occurred while deleting package with UUID: %s: %s", package_uuid, e)
+        return False
+
+    if response.status_code == 200:
+        logger.info("Successfully deleted package with UUID: %s", package_uuid)
+        return True
+
+    logger.error("Failed to delete package with UUID: %s. Status Code: %s", package_uuid, response.status_code)
+    # The response body is only read when it will actually be shown
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Response: %s", response.text)
+    return False
+
 def delete_test_packages(test_packages):
-    print("Attempting to delete test packages...")
-    for package in test_packages:
-        package_uuid = package.get("uuid")
-        tenant_name = package.get("tenant_meta", {}).get("namespace")
-
-        if package_uuid and tenant_name:
-            url = f"{API_URL}/namespaces/{tenant_name}/package-versions/{package_uuid}"
-            try:
-                print(f"Deleting test package with UUID: {package_uuid}")
-                response = requests.delete(url, headers=HEADERS, timeout=60)
-                if response.status_code == 200:
-                    print(f"Successfully deleted package with UUID: {package_uuid}")
-                else:
-                    print(f"Failed to delete package with UUID: {package_uuid}. Status Code: {response.status_code}, Response: {response.text}")
-            except requests.RequestException as e:
-                print(f"An error occurred while deleting package with UUID: {package_uuid}: {e}")
-        else:
-            print(f"Skipping package: Missing UUID or tenant name. Package details: {package}")
+    print(f"Attempting to delete test packages ({DELETE_WORKERS} at a time)...")
+    with ThreadPoolExecutor(max_workers=DELETE_WORKERS) as executor:
+        futures = [executor.submit(_delete_one, package) for package in test_packages]
+        deleted = sum(future.result() for future in as_completed(futures))
+    print(f"Deleted {deleted} of {len(test_packages)} test packages.")
 
 
 def main():
     parser = argparse.ArgumentParser(description="Fetch and potentially delete test packages.")
     parser.add_argument('--no-dry-run', action='store_true', help="Fetch and delete all identified test packages.")
+    parser.add_argument('--quiet', action='store_true', help="Only print summaries and errors, not a line per package.")
+    parser.add_argument('--debug', action='store_true', help="Also print the response body of failed deletions.")
     args = parser.parse_args()
 
+    if args.debug:
+        logger.setLevel(logging.DEBUG)
+    elif args.quiet:
+        logger.setLevel(logging.WARNING)
+
     test_packages = get_test_packages()
     print(f"Found {len(test_packages)} test packages.")
 
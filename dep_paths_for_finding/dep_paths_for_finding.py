@@ -1,8 +1,20 @@
+import base64
+import hashlib
 import json
 import sys
 import os
 import logging
+import time
+from pathlib import Path
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+    ORJSON_SUPPORT = True
+except ImportError:
+    ORJSON_SUPPORT = False
 
 namespace = sys.argv[1]
 finding_uuid = sys.argv[2]
@@ -15,7 +27,63 @@ logger.setLevel(logging.WARN)
 ENDOR_API_CREDENTIALS_KEY = os.getenv("ENDOR_API_CREDENTIALS_KEY")
 ENDOR_API_CREDENTIALS_SECRET = os.getenv("ENDOR_API_CREDENTIALS_SECRET")
 
+# On-disk cache of the API token, reused until TOKEN_EXPIRY_SKEW seconds before it expires
+TOKEN_CACHE_PATH = Path("~/.endor/token.json").expanduser()
+TOKEN_EXPIRY_SKEW = 60
+
+# One Session for every API call so the TCP/TLS connection is reused
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+))
+
+def loads_json(data):
+    """Parse JSON bytes, using orjson when it is installed."""
+    if ORJSON_SUPPORT:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _token_expiry(token):
+    """Return the exp claim of a JWT as epoch seconds, or None if it cannot be read."""
+    try:
+        payload = token.split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        return float(claims['exp'])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return None
+
+def read_cached_token(api_key):
+    """Return the cached token for api_key if it is valid for more than TOKEN_EXPIRY_SKEW seconds."""
+    try:
+        with open(TOKEN_CACHE_PATH) as f:
+            cached = json.load(f)
+        key_hash = hashlib.sha256((api_key or "").encode()).hexdigest()
+        if cached.get('key_sha256') == key_hash and time.time() < cached['exp'] - TOKEN_EXPIRY_SKEW:
+            return cached['token']
+    except (OSError, AttributeError, KeyError, TypeError, ValueError):
+        pass
+    return None
+
+def write_cached_token(api_key, token):
+    """Store the token for api_key in the cache (mode 0600), ignoring filesystem errors."""
+    exp = _token_expiry(token)
+    if exp is None:
+        return
+    try:
+        TOKEN_CACHE_PATH.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        tmp_path = TOKEN_CACHE_PATH.with_suffix(f".{os.getpid()}.tmp")
+        with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+            json.dump({'key_sha256': hashlib.sha256((api_key or "").encode()).hexdigest(), 'token': token, 'exp': exp}, f)
+        os.replace(tmp_path, TOKEN_CACHE_PATH)
+    except OSError as e:
+        print(f"Warning: could not write token cache {TOKEN_CACHE_PATH}: {e}")
+
 def endor_api_get_auth_token(api_key: str, api_secret: str):
+    token = read_cached_token(api_key)
+    if token:
+        return token
     url = "https://api.endorlabs.com/v1/auth/api-key"
     payload = {
         "key": api_key,
@@ -25,9 +93,10 @@ def endor_api_get_auth_token(api_key: str, api_secret: str):
         "Content-Type": "application/json",
         "Request-Timeout": "60"
     }
-    response = requests.post(url, json=payload, headers=headers, timeout=60)
+    response = SESSION.post(url, json=payload, headers=headers, timeout=60)
     if response.status_code == 200:
-        token = response.json().get('token')
+        token = loads_json(response.content).get('token')
+        write_cached_token(api_key, token)
         return token
     else:
         raise Exception(f"Failed to get token: {response.status_code}, {response.text}")
@@ -43,13 +112,13 @@ def endor_api_get(auth_token, namespace, uri, params = {}) -> json:
         "Request-Timeout": "20"
     }
 
-    response = requests.get(
+    response = SESSION.get(
         url=url,
         params=params,
         headers=headers
     )
 
-    return response.json()
+    return loads_json(response.content)
 
 
 def get_finding(auth_token, namespace, finding_uuid):
@@ -60,48 +129,77 @@ def get_package_version(auth_token, namespace, package_version_uuid):
     package_version = endor_api_get(auth_token, namespace, f"package-versions/{package_version_uuid}")
     return package_version
 
-def add_public_to_path(path, package_version):
-    path_list = []
+def get_public_by_name(package_version):
+    """Map each dependency name to its public flag; the first entry for a name wins."""
     deps_list = package_version['spec']['resolved_dependencies']['dependencies']
+    public_by_name = {}
+    for x in deps_list:
+        public_by_name.setdefault(sys.intern(x['name']), x['public'])
+    return public_by_name
+
+def intern_dep_graph(dep_graph):
+    """Return a copy of the dependency graph with every name interned.
+
+    The JSON decoder creates a new string for each occurrence of a name; interning
+    them lets the path walk compare names by identity instead of by content.
+    """
+    return {
+        sys.intern(parent): [sys.intern(dep) for dep in dependencies]
+        for parent, dependencies in dep_graph.items()
+    }
+
+def get_parents_by_dep(dep_graph):
+    """Invert the dependency graph: map each dependency to its parents, in dependency dictionary order."""
+    parents_by_dep = {}
+    for parent, dependencies in dep_graph.items():
+        for dep in dependencies:
+            parents = parents_by_dep.setdefault(dep, [])
+            # A dependency listed twice under one parent still has that parent once
+            if not parents or parents[-1] != parent:
+                parents.append(parent)
+    return parents_by_dep
+
+def add_public_to_path(path, public_by_name):
+    path_list = []
 
     for dep in path:
-        dep_match = [x for x in deps_list if x['name'] == dep]
-        logger.debug(f"{dep_match=}")
-        if not dep_match:
-            dep_match = [{"public": False}]
         path_list.append(
             {
                 "dependency_name": dep,
-                "public": dep_match[0]['public']
+                "public": public_by_name.get(dep, False)
             }
         )
     return path_list
 
-def get_all_dep_paths_for_dep(package_version, dep, finding_uuid, current_path=None, all_paths=None):
-    dep_graph = package_version['spec']['resolved_dependencies']['dependency_graph']
-    if current_path is None:
-        current_path = []
-    if all_paths is None:
-        all_paths = {}
-        all_paths[finding_uuid] = []
-
-    # Add the current node to the path
-    current_path.append(dep)
-
-    # Check if the node is in the dependency dictionary
-    if dep in dep_graph:
-        # If there are no parents (base case), add the path to all_paths
-        if not any(dep in deps for deps in dep_graph.values()): # or not any(dep in deps for deps in deps_list if deps['public'] is False):
-            all_paths[finding_uuid].append(add_public_to_path(current_path, package_version))
-
-        else:
-            # Iterate through all items in the dependency dictionary
-            for parent, dependencies in dep_graph.items():
-                if dep in dependencies:
-                    # Recursive call to find parents
-                    get_all_dep_paths_for_dep(package_version, parent, finding_uuid, current_path[:], all_paths)
-
-    return all_paths
+def get_all_dep_paths_for_dep(package_version, dep, finding_uuid):
+    dep_graph = intern_dep_graph(package_version['spec']['resolved_dependencies']['dependency_graph'])
+    dep = sys.intern(dep)
+    parents_by_dep = get_parents_by_dep(dep_graph)
+    public_by_name = get_public_by_name(package_version)
+    dep_paths = []
+
+    # Walk up from dep depth-first; each stack entry carries its path so far as a tuple.
+    # Paths are not memoized per node: with the cycle check below, the paths above a
+    # node depend on which nodes are already on the path, so a per-node cache would be
+    # wrong on cyclic graphs.
+    stack = [(dep, (dep,))]
+    while stack:
+        node, path = stack.pop()
+        # Nodes missing from the dependency dictionary end no path
+        if node not in dep_graph:
+            continue
+        parents = parents_by_dep.get(node)
+        # If there are no parents (base case), the node is the root of its path
+        if not parents:
+            dep_paths.append(add_public_to_path(path, public_by_name))
+            continue
+        # Pushed in reverse so parents are visited in dependency dictionary order;
+        # a parent already on the path would be a cycle and is not followed
+        for parent in reversed(parents):
+            if parent not in path:
+                stack.append((parent, path + (parent,)))
+
+    return {finding_uuid: dep_paths}
 
 
 if __name__ == "__main__":
@@ -2,16 +2,155 @@
 
 import os
 import sys
+import base64
+import hashlib
 import re
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import argparse
+import csv
 import subprocess
 import time
 import json
-from typing import Dict, List, Optional, Any
+import queue
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Any, Tuple
 from dotenv import load_dotenv
 
-def get_endor_token() -> str:
+try:
+    import orjson
+    ORJSON_SUPPORT = True
+except ImportError:
+    ORJSON_SUPPORT = False
+
+try:
+    import ijson
+    IJSON_SUPPORT = True
+except ImportError:
+    IJSON_SUPPORT = False
+
+try:
+    import ahocorasick
+    AHOCORASICK_SUPPORT = True
+except ImportError:
+    AHOCORASICK_SUPPORT = False
+
+# On-disk cache of the API token, reused until TOKEN_EXPIRY_SKEW seconds before it expires
+TOKEN_CACHE_PATH = Path("~/.endor/token.json").expanduser()
+TOKEN_EXPIRY_SKEW = 60
+
+# Seconds to wait for a connection to the API; reads wait READ_TIMEOUT seconds, or the
+# --timeout value plus READ_TIMEOUT_GRACE when listing secrets
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 60
+READ_TIMEOUT_GRACE = 5
+
+# Transient errors are retried up to this many times with exponential backoff, honouring
+# Retry-After. POST only creates policies, so it is left out to avoid duplicates.
+RETRY_TOTAL = 5
+RETRY_METHODS = frozenset({"GET", "PATCH", "DELETE"})
+
+# Rego rule of each exception policy; {locations_block} is filled in by _build_rule
+RULE_TEMPLATE = (
+    "package main\n\n"
+    "exclude_by_location[result] {{\n"
+    "  some i\n"
+    "  data.resources.Finding[i].spec.finding_categories[_] == \"FINDING_CATEGORY_SECRETS\"\n"
+    "  {locations_block}\n"
+    "  locations[_] == data.resources.Finding[i].spec.finding_metadata.source_policy_info.results[_].fields[\"Secret Location\"] \n\n"
+    "  result = {{\n"
+    "    \"Endor\" : {{\n"
+    "      \"Finding\" : data.resources.Finding[i].uuid\n"
+    "    }}\n"
+    "  }}\n"
+    "}}"
+)
+
+# Escapes quotes inside a location string for Rego
+REGO_QUOTE_TABLE = str.maketrans({'"': '\\"'})
+
+def loads_json(data: bytes) -> Any:
+    """Parse JSON bytes, using orjson when it is installed."""
+    if ORJSON_SUPPORT:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps_json(obj: Any) -> bytes:
+    """Serialize obj to JSON bytes, using orjson when it is installed."""
+    if ORJSON_SUPPORT:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode()
+
+def parse_findings_page(stream: Any) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Parse a findings list response from a file-like stream with ijson.
+
+    Findings are built one at a time as the bytes arrive, so the response body is
+    never held in memory as a whole. Returns the findings and the next page token.
+    """
+    findings: List[Dict[str, Any]] = []
+    next_page_token = None
+    builder = None
+    for prefix, event, value in ijson.parse(stream, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == "list.objects.item" and event == "end_map":
+                findings.append(builder.value)
+                builder = None
+        elif prefix == "list.objects.item" and event == "start_map":
+            builder = ijson.ObjectBuilder()
+            builder.event(event, value)
+        elif prefix == "list.response.next_page_token":
+            next_page_token = value
+    return findings, next_page_token
+
+def create_session() -> requests.Session:
+    """Create a Session that reuses its connections across API calls and retries transient errors."""
+    session = requests.Session()
+    retry = Retry(total=RETRY_TOTAL, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                  allowed_methods=RETRY_METHODS, raise_on_status=False)
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=32, max_retries=retry))
+    return session
+
+def _token_expiry(token: str) -> Optional[float]:
+    """Return the exp claim of a JWT as epoch seconds, or None if it cannot be read."""
+    try:
+        payload = token.split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        return float(claims['exp'])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return None
+
+def read_cached_token(api_key: str) -> Optional[str]:
+    """Return the cached token for api_key if it is valid for more than TOKEN_EXPIRY_SKEW seconds."""
+    try:
+        with open(TOKEN_CACHE_PATH) as f:
+            cached = json.load(f)
+        key_hash = hashlib.sha256((api_key or "").encode()).hexdigest()
+        if cached.get('key_sha256') == key_hash and time.time() < cached['exp'] - TOKEN_EXPIRY_SKEW:
+            return cached['token']
+    except (OSError, AttributeError, KeyError, TypeError, ValueError):
+        pass
+    return None
+
+def write_cached_token(api_key: str, token: str) -> None:
+    """Store the token for api_key in the cache (mode 0600), ignoring filesystem errors."""
+    exp = _token_expiry(token)
+    if exp is None:
+        return
+    try:
+        TOKEN_CACHE_PATH.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        tmp_path = TOKEN_CACHE_PATH.with_suffix(f".{os.getpid()}.tmp")
+        with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+            json.dump({'key_sha256': hashlib.sha256((api_key or "").encode()).hexdigest(), 'token': token, 'exp': exp}, f)
+        os.replace(tmp_path, TOKEN_CACHE_PATH)
+    except OSError as e:
+        print(f"Warning: could not write token cache {TOKEN_CACHE_PATH}: {e}")
+
+def get_endor_token(session: requests.Session) -> str:
     """Get Endor token either directly or by authenticating with API credentials."""
     # Try to get token directly first
     token = os.getenv('ENDOR_TOKEN')
@@ -26,21 +165,28 @@ def get_endor_token() -> str:
         print("Error: Either ENDOR_TOKEN or both ENDOR_API_CREDENTIALS_KEY and ENDOR_API_CREDENTIALS_SECRET must be set")
         sys.exit(1)
 
+    token = read_cached_token(key)
+    if token:
+        return token
+
     # Get token using API credentials
     try:
-        response = requests.post(
+        response = session.post(
             "https://api.endorlabs.com/v1/auth/api-key",
-            json={"key": key, "secret": secret}
+            data=dumps_json({"key": key, "secret": secret}),
+            headers={"Content-Type": "application/json"},
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
         )
         if response.status_code != 200:
             print(f"Error: Failed to get token from API. Status code: {response.status_code}")
             sys.exit(1)
         
-        token = response.json().get('token')
+        token = loads_json(response.content).get('token')
         if not token:
             print("Error: No token in API response")
             sys.exit(1)
-            
+
+        write_cached_token(key, token)
         return token
     except Exception as e:
         print(f"Error getting token from API: {e}")
@@ -49,7 +195,7 @@ def get_endor_token() -> str:
 class SecretExcepter:
     """Handles Excepting secrets in Endor Labs given a set of locations."""
     
-    def __init__(self, namespace: str, debug: bool = False, dry_run: bool = True, project_uuid: str = None, locations_file: str = None, timeout_seconds: int = 60):
+    def __init__(self, namespace: str, debug: bool = False, dry_run: bool = True, project_uuid: str = None, locations_file: str = None, timeout_seconds: int = 60, server_side_filter: bool = False, page_size: int = 500):
         self.namespace = namespace
         self.debug = debug
         self.dry_run = dry_run
@@ -59,94 +205,203 @@ class SecretExcepter:
         self.base_url = "https://api.endorlabs.com"
         self.policy_name_base = "Scripted Secret Exceptions - Do Not Modify"
         self.max_locations_per_policy = 150
+        self.max_locations_per_filter = 50
+        # Server-side filters are paged independently, this many at a time
+        self.max_concurrent_filters = 8
+        # Policy creates, updates and deletes sent at once
+        self.max_concurrent_policy_changes = 8
         self.timeout_seconds = timeout_seconds
+        self.server_side_filter = server_side_filter
+        self.page_size = page_size
+        # Only the finding fields this script reads
+        self.secret_field_mask = "uuid,meta.description,tenant_meta.namespace,spec.finding_tags,spec.finding_metadata.source_policy_info.results"
         
-        # Get authentication token
-        self.token = get_endor_token()
+        # Get authentication token and attach it to the shared session
+        self.session = create_session()
+        self.token = get_endor_token(self.session)
+        self.session.headers.update({
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/json"
+        })
         
         # Load locations from file if provided
         self.locations = self._load_locations_from_file() if locations_file else []
+        self._locations_automaton = self._build_locations_automaton()
+
+        # The findings listing's filters and extra headers are the same for every request
+        self._findings_filters = self._build_findings_filters()
+        self._findings_headers = {
+            "Request-Timeout": str(self.timeout_seconds)
+        }
         
         # Create log file for Excepted secrets
         epoch_time = str(int(time.time()))
         self.log_file = f"Except_secrets_by_location.excepted.{epoch_time}.log"
         
-        # Write CSV header to log file
+        # Keep the log file open for the whole run; rows are buffered and written on close()
+        self._log_fh = None
+        self._log_writer = None
         try:
-            with open(self.log_file, 'w') as f:
-                f.write('"Namespace","Secret UUID","Description","Matched Location"\n')
+            self._log_fh = open(self.log_file, 'w', newline='', buffering=1 << 20)
+            self._log_writer = csv.writer(self._log_fh, quoting=csv.QUOTE_ALL, lineterminator='\n')
+            self._log_writer.writerow(["Namespace", "Secret UUID", "Description", "Matched Location"])
         except Exception as e:
             if self.debug:
                 print(f"Error creating log file header: {e}")
 
+    def close(self) -> None:
+        """Flush and close the log file."""
+        if self._log_fh is not None:
+            self._log_fh.close()
+            self._log_fh = None
+
     def get_secrets(self) -> List[Dict[str, Any]]:
         """Get all secrets in the namespace or a specific project if UUID is provided."""
         try:
-            headers = {
-                "Authorization": f"Bearer {self.token}",
-                "Content-Type": "application/json",
-                "Request-Timeout": str(self.timeout_seconds)
-            }
+            return list(self.iter_secrets())
+        except Exception as e:
+            print(f"Error fetching secrets: {e}")
+            return []
 
-            url = f"{self.base_url}/v1/namespaces/{self.namespace}/findings"
+    def iter_secrets(self) -> Iterator[Dict[str, Any]]:
+        """Yield secrets findings page by page, raising if a page cannot be fetched.
 
-            filter = "context.type==CONTEXT_TYPE_MAIN and spec.finding_categories contains ['FINDING_CATEGORY_SECRETS']"
-            
-            if self.project_uuid:
-                # Get specific project
-                filter += f" and spec.project_uuid=={self.project_uuid}"
-                if self.debug:
-                    print(f"Fetching specific project from: {url}")
-                    
-            all_secrets = []
-            next_page_token = None
-            page_count = 0
+        Each filter's pages are fetched on a background thread, at most one page ahead
+        of the caller, and several server-side filters are paged at once. Findings are still yielded
+        in filter order, then page order.
+        """
+        url = f"{self.base_url}/v1/namespaces/{self.namespace}/findings"
+        filters = self._findings_filters
+
+        if self.project_uuid and self.debug:
+            print(f"Fetching specific project from: {url}")
+
+        def fetch_page(list_filter: str, page_token: Optional[str]) -> requests.Response:
+            params = {
+                "list_parameters.filter": list_filter,
+                "list_parameters.page_size": self.page_size,
+                "list_parameters.mask": self.secret_field_mask,
+                "list_parameters.traverse": "true"
+            }
             
-            while True:
-                page_count += 1
-                params = {
-                    "list_parameters.filter": filter,
-                    "list_parameters.page_size": 500,
-                    "list_parameters.traverse": "true"
-                }
-                
-                if next_page_token:
-                    params["list_parameters.page_token"] = next_page_token
-                
-                if self.debug:
-                    print(f"Fetching page {page_count}...")
+            if page_token:
+                params["list_parameters.page_token"] = page_token
 
-                response = requests.get(url, headers=headers, params=params)
-                
-                if self.debug:
-                    print(f"Response: {response.status_code}")
-                    if response.status_code != 200:
-                        print(f"Response: {response.json()}")
-                
-                if response.status_code == 200:
-                    response_data = response.json()
-                    secrets_findings = response_data['list']['objects']
-                    all_secrets.extend(secrets_findings)
-                    
+            # With ijson the body is parsed straight from the connection
+            return self.session.get(url, headers=self._findings_headers, params=params, stream=IJSON_SUPPORT,
+                                    timeout=(CONNECT_TIMEOUT, self.timeout_seconds + READ_TIMEOUT_GRACE))
+
+        stop = threading.Event()
+
+        def put_page(pages: queue.Queue, item: Any) -> bool:
+            """Wait for room on pages and put item there; return False if the listing stopped first."""
+            while not stop.is_set():
+                try:
+                    # Wake up regularly so a stopped listing never leaves this thread blocked
+                    pages.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def fetch_filter(filter_number: int, list_filter: str, pages: queue.Queue) -> None:
+            """Put each page of findings for list_filter on pages, then None, or the error that stopped it."""
+            try:
+                page_token = None
+                page_number = 0
+                while not stop.is_set():
+                    page_number += 1
                     if self.debug:
-                        print(f"Found {len(secrets_findings)} secrets findings on page {page_count}")
-                    
+                        print(f"Fetching page {page_number} of filter {filter_number}...")
+
+                    response = fetch_page(list_filter, page_token)
+                    with response:
+                        if self.debug:
+                            print(f"Response: {response.status_code}")
+                            if response.status_code != 200:
+                                print(f"Response: {loads_json(response.content)}")
+                        
+                        if response.status_code != 200:
+                            raise RuntimeError(f"{response.status_code} - {response.text}")
+
+                        if IJSON_SUPPORT:
+                            # Undo any gzip/deflate transfer encoding while streaming
+                            response.raw.decode_content = True
+                            secrets_findings, page_token = parse_findings_page(response.raw)
+                        else:
+                            response_data = loads_json(response.content)
+                            secrets_findings = response_data['list']['objects']
+                            page_token = response_data['list']['response'].get('next_page_token')
+                    if not put_page(pages, secrets_findings):
+                        return
+
                     # Check for next page token
-                    next_page_token = response_data['list']['response'].get('next_page_token')
-                    if not next_page_token:
+                    if not page_token:
                         break
-                else:
-                    print(f"Error fetching secrets: {response.status_code} - {response.text}")
-                    return []
-            
-            if self.debug:
-                print(f"Total found {len(all_secrets)} secrets findings across {page_count} pages")
-            return all_secrets
-                
-        except Exception as e:
-            print(f"Error fetching secrets: {e}")
-            return []
+                put_page(pages, None)
+            except Exception as e:
+                put_page(pages, e)
+
+        seen_uuids = set()
+        secrets_count = 0
+        page_count = 0
+        # One page waits per filter while the next is fetched, which bounds memory use
+        filter_pages = [queue.Queue(maxsize=1) for _ in filters]
+
+        with ThreadPoolExecutor(max_workers=min(len(filters), self.max_concurrent_filters)) as executor:
+            try:
+                for filter_number, (list_filter, pages) in enumerate(zip(filters, filter_pages), start=1):
+                    executor.submit(fetch_filter, filter_number, list_filter, pages)
+
+                for pages in filter_pages:
+                    while True:
+                        secrets_findings = pages.get()
+                        if secrets_findings is None:
+                            break
+                        if isinstance(secrets_findings, Exception):
+                            raise secrets_findings
+
+                        page_count += 1
+                        if self.debug:
+                            print(f"Found {len(secrets_findings)} secrets findings on page {page_count}")
+
+                        # A finding matching locations from several filters is listed once
+                        for secret in secrets_findings:
+                            if secret['uuid'] not in seen_uuids:
+                                seen_uuids.add(secret['uuid'])
+                                secrets_count += 1
+                                yield secret
+            finally:
+                # Filters still paging stop after their current request
+                stop.set()
+        
+        if self.debug:
+            print(f"Total found {secrets_count} secrets findings across {page_count} pages")
     
+    def _build_findings_filters(self) -> List[str]:
+        """Build the filters that together list every secrets finding to check."""
+        filter = "context.type==CONTEXT_TYPE_MAIN and spec.finding_categories contains ['FINDING_CATEGORY_SECRETS']"
+        
+        if self.project_uuid:
+            # Get specific project
+            filter += f" and spec.project_uuid=={self.project_uuid}"
+
+        if not (self.server_side_filter and self.locations):
+            return [filter]
+        # Let the server drop findings that match no location; long location
+        # lists are split so each filter stays a manageable size
+        return [
+            f"{filter} and {self._build_location_filter(chunk)}"
+            for chunk in self._chunk_list(self.locations, self.max_locations_per_filter)
+        ]
+
+    @staticmethod
+    def _build_location_filter(locations: List[str]) -> str:
+        """Build a filter clause matching findings whose Secret Location contains any of the locations."""
+        pattern = ".*(" + "|".join(re.escape(location) for location in locations) + ").*"
+        quoted = pattern.replace('\\', '\\\\').replace('"', '\\"')
+        return f'spec.finding_metadata.source_policy_info.results.fields["Secret Location"] matches "{quoted}"'
+
     def _load_locations_from_file(self) -> List[str]:
         """Load locations from the specified file."""
         if not self.locations_file:
@@ -162,143 +417,145 @@ class SecretExcepter:
             print(f"Error loading locations from {self.locations_file}: {e}")
             return []
     
-    def _should_except_secret(self, secret: Dict[str, Any]) -> bool:
-        """Check if a secret should be Excepted based on its locations."""
-        if not self.locations:
-            # If no locations file provided, Except all secrets
-            return True
-        
+    def _build_locations_automaton(self) -> Optional[Any]:
+        """Build an Aho-Corasick automaton over the locations, or None without pyahocorasick."""
+        if not AHOCORASICK_SUPPORT or not self.locations:
+            return None
+        automaton = ahocorasick.Automaton()
+        for index, location in enumerate(self.locations):
+            # Keep the first index of a repeated location so file order decides ties
+            if location not in automaton:
+                automaton.add_word(location, (index, location))
+        automaton.make_automaton()
+        return automaton
+
+    def _find_location(self, secret_location: str) -> Optional[str]:
+        """Return the first location, in file order, contained in secret_location, else None."""
+        if self._locations_automaton is not None:
+            # One pass over secret_location finds every contained location at once
+            hits = [hit for _, hit in self._locations_automaton.iter(secret_location)]
+            return min(hits)[1] if hits else None
+        return next((location for location in self.locations if location in secret_location), None)
+
+    def _scan_secret(self, secret: Dict[str, Any]) -> Tuple[Optional[str], List[str]]:
+        """Walk a secret's results once and return its matched location and its exception locations.
+
+        The matched location is the location from the locations file that matches the
+        first matching result, or None if the secret should not be Excepted. The
+        exception locations are the 'Secret Location' values the exception policy
+        should cover; the walk stops at the first malformed result, keeping those
+        found before it.
+        """
+        # If no locations file provided, Except all secrets
+        matched_location = None if self.locations else "N/A"
+        exception_locations: List[str] = []
         try:
             results = secret['spec']['finding_metadata']['source_policy_info']['results']
             for result in results:
                 secret_location = result['fields']['Secret Location']
-                if any(location in secret_location for location in self.locations):
+                if not self.locations:
+                    exception_locations.append(secret_location)
+                    continue
+                location = self._find_location(secret_location)
+                if location is None:
+                    continue
+                if matched_location is None:
+                    matched_location = location
                     if self.debug:
                         print(f"Secret location '{secret_location}' matches locations file")
-                    return True
-            return False
+                exception_locations.append(secret_location)
+            return matched_location, exception_locations
         except (KeyError, TypeError) as e:
-            if self.debug:
+            if self.debug and matched_location is None:
                 print(f"Error checking secret locations: {e}")
-            return False
-    
-    def _get_matched_location(self, secret: Dict[str, Any]) -> str:
-        """Get the location from the locations file that matches this secret."""
-        if not self.locations:
-            return "N/A"
-        
-        try:
-            results = secret['spec']['finding_metadata']['source_policy_info']['results']
-            for result in results:
-                secret_location = result['fields']['Secret Location']
-                for location in self.locations:
-                    if location in secret_location:
-                        return location
-            return "Unknown"
-        except (KeyError, TypeError):
-            return "Error"
-
-    def _log_Excepted_secret(self, secret: Dict[str, Any]) -> None:
-        """Log a Excepted secret to the log file in CSV format."""
+            return matched_location, exception_locations
+
+    def _excepted_secret_row(self, secret: Dict[str, Any], matched_location: str) -> Optional[List[str]]:
+        """Return the log file row for a Excepted secret, or None if the secret cannot be logged."""
         try:
-            matched_location = self._get_matched_location(secret)
             # Extract namespace from tenant_meta
             namespace = secret.get('tenant_meta', {}).get('namespace', 'Unknown')
-            
-            # Escape commas and quotes in the fields
-            secret_uuid = secret['uuid'].replace(',', ';').replace('"', '""')
-            description = secret['meta']['description'].replace(',', ';').replace('"', '""')
-            namespace = namespace.replace(',', ';').replace('"', '""')
-            matched_location = matched_location.replace(',', ';').replace('"', '""')
-            
-            with open(self.log_file, 'a') as f:
-                f.write(f'"{namespace}","{secret_uuid}","{description}","{matched_location}"\n')
+            return [namespace, secret['uuid'], secret['meta']['description'], matched_location]
         except Exception as e:
             if self.debug:
                 print(f"Error logging Excepted secret: {e}")
+            return None
 
-    def _collect_exception_locations(self, secrets: List[Dict[str, Any]]) -> List[str]:
-        """Collect unique 'Secret Location' values from secrets that should be excepted."""
-        unique_locations: List[str] = []
-        seen = set()
-        for secret in secrets:
-            if not self._should_except_secret(secret):
-                continue
-            try:
-                results = secret['spec']['finding_metadata']['source_policy_info']['results']
-                for result in results:
-                    secret_location = result['fields']['Secret Location']
-                    if (not self.locations) or any(loc in secret_location for loc in self.locations):
-                        if secret_location not in seen:
-                            seen.add(secret_location)
-                            unique_locations.append(secret_location)
-            except (KeyError, TypeError):
+    def _log_Excepted_secrets(self, rows: List[List[str]]) -> None:
+        """Log Excepted secrets to the log file in CSV format."""
+        try:
+            # csv.writer quotes every field and doubles embedded quotes
+            self._log_writer.writerows(rows)
+        except Exception as e:
+            if self.debug:
+                print(f"Error logging Excepted secrets: {e}")
+
+    def _match_secrets(self) -> Tuple[int, int, List[List[str]], List[str]]:
+        """Match secrets against the locations as their pages arrive.
+
+        Returns the number of secrets seen, the number to except, their log file rows,
+        and the unique 'Secret Location' values for the exception policy. Only these
+        flat values are kept; each finding is dropped once it has been scanned.
+        """
+        secrets_count = 0
+        excepted_count = 0
+        log_rows: List[List[str]] = []
+        # Insertion-ordered set of locations
+        unique_locations: Dict[str, None] = {}
+        for secret in self.iter_secrets():
+            secrets_count += 1
+            matched_location, exception_locations = self._scan_secret(secret)
+            if matched_location is None:
                 continue
-        return unique_locations
+            excepted_count += 1
+            row = self._excepted_secret_row(secret, matched_location)
+            if row is not None:
+                log_rows.append(row)
+            unique_locations.update(dict.fromkeys(exception_locations))
+        return secrets_count, excepted_count, log_rows, list(unique_locations)
 
     def _build_rule(self, locations: List[str]) -> str:
         """Build the Rego rule string containing provided locations array."""
         if not locations:
             locations_block = "locations := []"
         else:
-            # Escape quotes inside each location string for Rego
-            escaped = [loc.replace('"', '\\"') for loc in locations]
-            # Join with proper formatting
-            lines = []
-            for idx, loc in enumerate(escaped):
-                comma = "," if idx < len(escaped) - 1 else ""
-                lines.append(f'    "{loc}"{comma}')
-            locations_block = "locations := [\n" + "\n".join(lines) + " ]"
-        rule = (
-            "package main\n\n"
-            "exclude_by_location[result] {\n"
-            "  some i\n"
-            "  data.resources.Finding[i].spec.finding_categories[_] == \"FINDING_CATEGORY_SECRETS\"\n"
-            f"  {locations_block}\n"
-            "  locations[_] == data.resources.Finding[i].spec.finding_metadata.source_policy_info.results[_].fields[\"Secret Location\"] \n\n"
-            "  result = {\n"
-            "    \"Endor\" : {\n"
-            "      \"Finding\" : data.resources.Finding[i].uuid\n"
-            "    }\n"
-            "  }\n"
-            "}"
-        )
-        return rule
+            body = ",\n".join(f'    "{loc.translate(REGO_QUOTE_TABLE)}"' for loc in locations)
+            locations_block = f"locations := [\n{body} ]"
+        return RULE_TEMPLATE.format(locations_block=locations_block)
 
-    def _get_policy_by_exact_name(self, name: str) -> Optional[Dict[str, Any]]:
-        """Return existing policy dict by exact name if found, else None."""
+    def _get_existing_policies(self) -> Dict[str, Dict[str, Any]]:
+        """Return the existing numbered exception policies keyed by exact name, fetched in one listing."""
+        policies: Dict[str, Dict[str, Any]] = {}
         try:
-            headers = {
-                "Authorization": f"Bearer {self.token}",
-                "Content-Type": "application/json"
-            }
             url = f"{self.base_url}/v1/namespaces/{self.namespace}/policies"
+            # policy_name_base has no regex metacharacters, so it can be used as is
             params = {
-                "list_parameters.filter": f"meta.name==\"{name}\"",
-                "list_parameters.page_size": 1
+                "list_parameters.filter": f"meta.name matches \"^{self.policy_name_base} [0-9]+$\"",
+                "list_parameters.page_size": 500
             }
-            response = requests.get(url, headers=headers, params=params)
-            if self.debug:
-                print(f"Lookup policy response: {response.status_code}")
-            if response.status_code != 200:
+            while True:
+                response = self.session.get(url, params=params, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
                 if self.debug:
-                    print(f"Policy lookup error: {response.text}")
-                return None
-            data = response.json()
-            objs = data.get('list', {}).get('objects', [])
-            return objs[0] if objs else None
+                    print(f"Lookup policy response: {response.status_code}")
+                if response.status_code != 200:
+                    if self.debug:
+                        print(f"Policy lookup error: {response.text}")
+                    return policies
+                data = loads_json(response.content)
+                for policy in data.get('list', {}).get('objects', []):
+                    policies.setdefault(policy.get('meta', {}).get('name'), policy)
+                next_page_token = data.get('list', {}).get('response', {}).get('next_page_token')
+                if not next_page_token:
+                    return policies
+                params["list_parameters.page_token"] = next_page_token
         except Exception as e:
             if self.debug:
                 print(f"Error looking up policy: {e}")
-            return None
+            return policies
 
     def _create_policy(self, name: str, rule: str) -> bool:
         """Create a new exception policy with the provided rule and name."""
         try:
-            headers = {
-                "Authorization": f"Bearer {self.token}",
-                "Content-Type": "application/json"
-            }
             url = f"{self.base_url}/v1/namespaces/{self.namespace}/policies"
             payload = {
                     "meta": {
@@ -323,7 +580,7 @@ class SecretExcepter:
             if self.debug:
                 print("Creating exception policy with payload:")
                 print(json.dumps(payload, indent=2))
-            response = requests.post(url, headers=headers, json=payload)
+            response = self.session.post(url, data=dumps_json(payload), timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
             if response.status_code in (200, 201):
                 if self.debug:
                     print("Policy created successfully")
@@ -337,10 +594,6 @@ class SecretExcepter:
     def _update_policy_rule(self, policy_uuid: str, name: str, rule: str) -> bool:
         """Update an existing policy's name and spec.rule using update_mask."""
         try:
-            headers = {
-                "Authorization": f"Bearer {self.token}",
-                "Content-Type": "application/json"
-            }
             url = f"{self.base_url}/v1/namespaces/{self.namespace}/policies"
             payload = {
                 "request": {
@@ -361,7 +614,7 @@ class SecretExcepter:
             if self.debug:
                 print("Updating exception policy with payload:")
                 print(json.dumps(payload, indent=2))
-            response = requests.patch(url, headers=headers, json=payload)
+            response = self.session.patch(url, data=dumps_json(payload), timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
             if response.status_code == 200:
                 if self.debug:
                     print("Policy updated successfully")
@@ -373,19 +626,17 @@ class SecretExcepter:
             return False
 
     @staticmethod
-    def _chunk_list(items: List[str], chunk_size: int) -> List[List[str]]:
-        return [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    def _chunk_list(items: Iterable[str], chunk_size: int) -> Iterator[List[str]]:
+        """Yield consecutive chunks of at most chunk_size items, each built only when it is needed."""
+        it = iter(items)
+        return iter(lambda: list(islice(it, chunk_size)), [])
 
     def _delete_policy(self, policy_uuid: str) -> bool:
         """Delete a policy by UUID."""
         try:
-            headers = {
-                "Authorization": f"Bearer {self.token}",
-                "Content-Type": "application/json"
-            }
             url = f"{self.base_url}/v1/namespaces/{self.namespace}/policies"
             payload = {"object": {"uuid": policy_uuid}}
-            response = requests.delete(url, headers=headers, json=payload)
+            response = self.session.delete(url, data=dumps_json(payload), timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
             if response.status_code in (200, 204):
                 if self.debug:
                     print(f"Policy deleted successfully: uuid={policy_uuid}")
@@ -399,11 +650,6 @@ class SecretExcepter:
     def except_secret(self, secret_finding: Dict[str, Any]) -> bool:
         """Except a secret finding."""
         try:
-            headers = {
-                "Authorization": f"Bearer {self.token}",
-                "Content-Type": "application/json"
-            }
-            
             url = f"{self.base_url}/v1/namespaces/{self.namespace}/findings"
             
             payload = {
@@ -427,7 +673,7 @@ class SecretExcepter:
                 print(f"URL: {url}")
                 print(f"Payload: {json.dumps(payload, indent=2)}")
             
-            response = requests.patch(url, headers=headers, json=payload)
+            response = self.session.patch(url, data=dumps_json(payload), timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
             
             if response.status_code == 200:
                 if self.debug:
@@ -441,6 +687,21 @@ class SecretExcepter:
             print(f"Error Excepting secret {secret_finding['uuid']}: {e}")
             return False
 
+    def _apply_policy_chunk(self, policy_change: Tuple[str, str, Optional[str]]) -> bool:
+        """Update the named policy's rule if it has a UUID, otherwise create it."""
+        policy_name, rule, policy_uuid = policy_change
+        if policy_uuid:
+            return self._update_policy_rule(policy_uuid, policy_name, rule)
+        return self._create_policy(policy_name, rule)
+
+    def _run_policy_changes(self, change: Any, items: List[Any]) -> bool:
+        """Call change on every item concurrently; return True if all of them succeeded."""
+        if not items:
+            return True
+        workers = min(len(items), self.max_concurrent_policy_changes)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return all(list(executor.map(change, items)))
+
     def run(self) -> int:
         """Main execution method."""
         print(f"Starting secrets Exception script for namespace: {self.namespace}")
@@ -449,23 +710,31 @@ class SecretExcepter:
         if self.dry_run:
             print("\n**** DRY RUN MODE  (use --no-dry-run to apply Exception Policy in Endor Labs) ****\n")
         
-        # Get all projects
-        secrets = self.get_secrets()
-        if not secrets:
+        # Decide which secrets to include and collect locations while the pages stream in
+        try:
+            secrets_count, success_count, log_rows, exception_locations = self._match_secrets()
+        except Exception as e:
+            print(f"Error fetching secrets: {e}")
+            print("No secrets found or error occurred")
+            return 1
+        # With the server-side filter, an empty listing means no secret matches any
+        # location, so the policies must still be emptied and the surplus removed
+        if not secrets_count and not (self.server_side_filter and self.locations):
             print("No secrets found or error occurred")
             return 1
         
-        print(f"Found {len(secrets)} secrets findings to process")
-        
-        # Decide which secrets to include and collect locations
-        exception_locations = self._collect_exception_locations(secrets)
+        print(f"Found {secrets_count} secrets findings to process")
+        skipped_count = secrets_count - success_count
         print(f"Collected {len(exception_locations)} unique 'Secret Location' values for exception policy")
 
         # Chunk locations across multiple policies if needed
-        location_chunks = self._chunk_list(exception_locations, self.max_locations_per_policy) or [[]]
+        location_chunks = list(self._chunk_list(exception_locations, self.max_locations_per_policy)) or [[]]
         if self.debug:
             print(f"Locations will be split across {len(location_chunks)} policy(ies) with up to {self.max_locations_per_policy} per policy")
 
+        # One listing answers every by-name lookup below
+        existing_policies = self._get_existing_policies()
+
         if self.dry_run:
             for idx, locs in enumerate(location_chunks, start=1):
                 policy_name = f"{self.policy_name_base} {idx}"
@@ -473,7 +742,7 @@ class SecretExcepter:
                 if self.debug:
                     print(f"Generated Rego rule for policy '{policy_name}':")
                     print(rule)
-                existing_policy = self._get_policy_by_exact_name(policy_name)
+                existing_policy = existing_policies.get(policy_name)
                 if existing_policy and existing_policy.get('uuid'):
                     print(f"Dry run - would update exception policy '{policy_name}' (uuid: {existing_policy.get('uuid')}) with update_mask spec.rule")
                 else:
@@ -482,68 +751,51 @@ class SecretExcepter:
             cleanup_start = len(location_chunks) + 1
             while True:
                 policy_name = f"{self.policy_name_base} {cleanup_start}"
-                existing_policy = self._get_policy_by_exact_name(policy_name)
+                existing_policy = existing_policies.get(policy_name)
                 if not existing_policy:
                     break
                 print(f"Dry run - would delete extra exception policy '{policy_name}' (uuid: {existing_policy.get('uuid')})")
                 cleanup_start += 1
             # Log all matched secrets even in dry-run for traceability
-            success_count = 0
-            skipped_count = 0
-            for secret in secrets:
-                if self._should_except_secret(secret):
-                    self._log_Excepted_secret(secret)
-                    success_count += 1
-                else:
-                    skipped_count += 1
+            self._log_Excepted_secrets(log_rows)
             print(f"\nDry run completed: would have Excepted {success_count} secrets, skipped {skipped_count} secrets")
             return 0
 
-        # Not dry run: create/update each policy chunk
+        # Not dry run: create/update each policy chunk. Every chunk is checked before
+        # any is sent, then the independent requests run concurrently
+        policy_changes = []
         for idx, locs in enumerate(location_chunks, start=1):
             policy_name = f"{self.policy_name_base} {idx}"
-            rule = self._build_rule(locs)
-            existing_policy = self._get_policy_by_exact_name(policy_name)
+            existing_policy = existing_policies.get(policy_name)
+            policy_uuid = None
             if existing_policy:
                 policy_uuid = existing_policy.get('uuid')
                 if not policy_uuid:
                     print(f"Error: Existing policy '{policy_name}' found but missing UUID")
                     return 1
-                ok = self._update_policy_rule(policy_uuid, policy_name, rule)
-                if not ok:
-                    return 1
-            else:
-                ok = self._create_policy(policy_name, rule)
-                if not ok:
-                    return 1
+            policy_changes.append((policy_name, self._build_rule(locs), policy_uuid))
+        if not self._run_policy_changes(self._apply_policy_chunk, policy_changes):
+            return 1
 
         # Delete any extra policies beyond what is needed
+        extra_policy_uuids = []
         cleanup_start = len(location_chunks) + 1
         while True:
             policy_name = f"{self.policy_name_base} {cleanup_start}"
-            existing_policy = self._get_policy_by_exact_name(policy_name)
+            existing_policy = existing_policies.get(policy_name)
             if not existing_policy:
                 break
             policy_uuid = existing_policy.get('uuid')
-            if not policy_uuid:
-                if self.debug:
-                    print(f"Skipping delete of '{policy_name}' because UUID is missing")
-                cleanup_start += 1
-                continue
-            ok = self._delete_policy(policy_uuid)
-            if not ok:
-                return 1
+            if policy_uuid:
+                extra_policy_uuids.append(policy_uuid)
+            elif self.debug:
+                print(f"Skipping delete of '{policy_name}' because UUID is missing")
             cleanup_start += 1
+        if not self._run_policy_changes(self._delete_policy, extra_policy_uuids):
+            return 1
 
         # Log all matched secrets
-        success_count = 0
-        skipped_count = 0
-        for secret in secrets:
-            if self._should_except_secret(secret):
-                self._log_Excepted_secret(secret)
-                success_count += 1
-            else:
-                skipped_count += 1
+        self._log_Excepted_secrets(log_rows)
 
         print(f"Successfully applied exception policy. Excepted {success_count} secrets, skipped {skipped_count} secrets")
         return 0
@@ -557,6 +809,8 @@ def main():
     parser.add_argument('--debug', action='store_true', help='Enable debug output')
     parser.add_argument('--timeout', type=int, default=60, help='Timeout in seconds for listing secrets only (default: 60)')
     parser.add_argument('--no-dry-run', action='store_true', help='Proceed with dimiss actions (default is dry run)')
+    parser.add_argument('--page-size', type=int, default=500, help='Secrets findings requested per page (default: 500)')
+    parser.add_argument('--server-side-filter', action='store_true', help='Ask the API to return only secrets whose location matches the locations file (locations are still checked locally)')
     args = parser.parse_args()
 
     # Load environment variables from .env file if it exists
@@ -569,10 +823,15 @@ def main():
         dry_run=not args.no_dry_run,
         project_uuid=args.project_uuid,
         locations_file=args.locations_file,
-        timeout_seconds=args.timeout
+        timeout_seconds=args.timeout,
+        server_side_filter=args.server_side_filter,
+        page_size=args.page_size
     )
 
-    exit_code = secret_Excepter.run()
+    try:
+        exit_code = secret_Excepter.run()
+    finally:
+        secret_Excepter.close()
     sys.exit(exit_code)
 
 